@@ -23,6 +23,80 @@ ANONYMIZE = True
 # LOW = 3, MEDIUM = 9, HARD = 30
 LAMBDA = 9.0
 
+# read the git history from a single `git log` pipe instead of
+# walking every commit through GitPython
+GIT_STREAM_LOG = True
+
+# number of revisions buffered before they are written to the database
+# in a single transaction while analyzing a branch
+INGESTION_BATCH_SIZE = 500
+
+# number of revisions fetched with a single `svn log` call and how many
+# of those windows are fetched concurrently
+SVN_LOG_WINDOW = 1000
+SVN_LOG_THREADS = 1
+
+# keep a local svnsync mirror of subversion repositories next to the
+# checkouts and read logs, diffs and checkouts from it
+SVN_MIRROR = False
+
+# write only the blobs of the modified files into a scratch tree when
+# measuring git revisions instead of checking out the whole revision
+GIT_BLOB_MEASURE = True
+
+# number of processes measuring the revisions of a branch in parallel.
+# every process gets its own working copy and result directory
+MEASURE_WORKERS = 1
+
+# reuse the measures of file contents that have been measured before
+MEASURE_CACHE = True
+
+# prepare the next revisions and store the results of the previous ones
+# while the checkers are running. the depth limits how many revisions may
+# wait between two of these stages. not used with sqlite, which only
+# allows a single writer
+MEASURE_PIPELINE = True
+MEASURE_PIPELINE_DEPTH = 2
+
+# analyze javascript files with a long running node process instead of
+# starting the complexity-report command line tool for every file
+COMPLEXITY_REPORT_WORKER = True
+
+# measure all java files of a revision with a single jhawk run using a
+# properties profile that only contains the metrics we are storing
+JHAWK_WHOLE_REVISION = True
+
+# limits of every checker invocation. the timeout is the wall clock time
+# and the cpu limit the processor time in seconds, the memory limit is the
+# address space in megabytes. None disables a limit
+CHECKER_TIMEOUT = 600
+CHECKER_CPU_LIMIT = None
+CHECKER_MEMORY_LIMIT = None
+
+# remember the contents which exceeded the limits of a checker and skip
+# them right away on later revisions and other branches
+CHECKER_QUARANTINE = True
+
+# skip minified, generated and vendored files instead of measuring them.
+# files larger than the maximum size (in kilobytes) or with an average
+# line length above the given one are skipped as well
+SOURCE_FILTER = True
+SOURCE_FILTER_MAX_SIZE = 512
+SOURCE_FILTER_LINE_LENGTH = 200
+
+# folders holding third party code. they are only looked for in the paths
+# of the given languages, a java package might just as well be a vendor
+SOURCE_FILTER_VENDOR_FOLDERS = [
+    "vendor",
+    "node_modules",
+    "bower_components",
+    "jspm_packages",
+    "third_party",
+    "third-party",
+    "thirdparty"
+]
+SOURCE_FILTER_VENDOR_TYPES = ["javascript"]
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3', # Add 'postgresql_psycopg2', 'mysql', 'sqlite3' or 'oracle'.
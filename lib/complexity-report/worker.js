@@ -0,0 +1,59 @@
+/*
+ * Long running complexity-report worker. Reads one JSON request per line
+ * from stdin ({"id": 1, "path": "/path/to/file.js"}) and answers every
+ * request with exactly one line on stdout containing either the report of
+ * the file or the error that occurred while analyzing it.
+ */
+var fs = require("fs");
+var readline = require("readline");
+
+// must be installed where node resolves it, e.g. with npm install -g
+// escomplex-js and NODE_PATH pointing to the global modules
+var escomplex = require("escomplex-js");
+
+var options = {
+    logicalor: true,
+    switchcase: true,
+    forin: false,
+    trycatch: false,
+    newmi: false
+};
+
+function respond(response) {
+    process.stdout.write(JSON.stringify(response) + "\n");
+}
+
+var lines = readline.createInterface({ input: process.stdin, terminal: false });
+
+lines.on("line", function (line) {
+    var request;
+
+    if (!line) {
+        return;
+    }
+
+    try {
+        request = JSON.parse(line);
+    } catch (e) {
+        return respond({ id: null, error: "Invalid request: " + e.message, fatal: false });
+    }
+
+    var source;
+
+    try {
+        source = fs.readFileSync(request.path, "utf8");
+    } catch (e) {
+        return respond({ id: request.id, error: e.message, fatal: false });
+    }
+
+    try {
+        respond({ id: request.id, report: escomplex.analyse(source, options) });
+    } catch (e) {
+        // same as the "Fatal error" of the cr command line tool
+        respond({ id: request.id, error: "Fatal error: " + e.message, fatal: true });
+    }
+});
+
+lines.on("close", function () {
+    process.exit(0);
+});
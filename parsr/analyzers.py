@@ -1,12 +1,21 @@
 import os
+import sys
 import shutil
+import threading
+import traceback
 
 import pysvn
 
+from multiprocessing import Pool
+from Queue import Queue, Full, Empty
+
+from django.db import connection
+
+from parsr import sql
 from parsr.connectors import Connector
 from parsr.checkers import JHawk, ComplexityReport, Lizard
 
-from analyzr.settings import RESULT_PATH
+from analyzr.settings import RESULT_PATH, MEASURE_WORKERS, MEASURE_PIPELINE, MEASURE_PIPELINE_DEPTH
 
 
 class AnalyzeError(Exception):
@@ -34,51 +43,203 @@ class AnalyzeError(Exception):
 
 class Analyzer(object):
 
-    analyzers = {}
+    checkers = {}
 
     @classmethod
     def parseable_types(cls):
         types = []
 
-        for key, value in cls.analyzers.iteritems():
+        for key, value in cls.checkers.iteritems():
             types.append(key)
 
         return types
 
     @classmethod
     def register(cls, mimetype, checker):
-        if not mimetype in cls.analyzers:
-            cls.analyzers[mimetype] = []
+        if not mimetype in cls.checkers:
+            cls.checkers[mimetype] = []
 
-        cls.analyzers[mimetype].append(BaseAnalyzer(checker))
+        cls.checkers[mimetype].append(checker)
 
-    def __init__(self, repo, branch):
+    def __init__(self, repo, branch, worker=None, cache=None, quarantine=None, source_filter=None):
         self.branch = branch
         self.connector = Connector.get(repo)
+        self.worker = worker
+        self.cache = cache
+        self.quarantine = quarantine
+        self.source_filter = source_filter
+
+        # every analyzer collects the files of the revision that is
+        # currently measured, so instances must not be shared
+        self.analyzers = {}
+
+        for mimetype, checkers in Analyzer.checkers.iteritems():
+            self.analyzers[mimetype] = [BaseAnalyzer(checker) for checker in checkers]
+
+        # workers leave the deltas to a final pass over all their files
+        self.measured_files = []
 
     def get_specific_analyzers(self, mimetype):
-        if not mimetype in Analyzer.analyzers:
+        if not mimetype in self.analyzers:
             return []
 
-        return Analyzer.analyzers[mimetype]
+        return self.analyzers[mimetype]
 
     def cleanup(self):
         for mimetype, analyzers in self.analyzers.iteritems():
             [analyzer.clear() for analyzer in analyzers]
 
-    def measure(self, revision):
+    # returns the measures and new cache entries without storing anything
+    def collect(self, revision, files=None):
         self.cleanup()
 
-        for f in revision.modified_files():
+        if files is None:
+            files = revision.modified_files()
+
+        if self.source_filter:
+            files = self.skip_filtered(files)
+
+        for f in files:
             for analyzer in self.get_specific_analyzers(f.mimetype):
                 analyzer.add_file(f)
 
+        results = {}
+        entries = []
+
         for mimetype, analyzers in self.analyzers.iteritems():
             for analyzer in analyzers:
-                if not analyzer.empty():
-                    results = analyzer.measure(revision, self.connector)
+                if analyzer.empty():
+                    continue
+
+                hashes = {}
+
+                if self.quarantine or (self.cache and analyzer.checker.CACHEABLE):
+                    hashes = self.get_hashes(analyzer)
+
+                if self.quarantine:
+                    self.skip_quarantined(analyzer, hashes)
+
+                    if analyzer.empty():
+                        continue
+
+                if self.cache and analyzer.checker.CACHEABLE:
+                    measures, cached = self.measure_cached(revision, analyzer, hashes)
+
+                    entries.append((analyzer.checker, cached))
+                else:
+                    measures = analyzer.measure(revision, self.connector)
+
+                if self.quarantine and analyzer.timeouts:
+                    self.quarantine.add(analyzer.checker, [
+                        hashes[f.full_path()] for f in analyzer.timeouts if f.full_path() in hashes
+                    ])
+
+                if measures:
+                    results.update(measures)
+
+        return results, entries
+
+    def get_hashes(self, analyzer):
+        hashes = {}
+
+        for f in analyzer.files:
+            content_hash = self.connector.get_content_hash(f)
+
+            if content_hash:
+                hashes[f.full_path()] = content_hash
+
+        return hashes
+
+    def skip_filtered(self, files):
+        base_path = self.connector.get_source_path()
+
+        reasons = {}
+
+        for f in files:
+            reason = self.source_filter.classify(base_path, f.full_path(), f.mimetype)
+
+            if reason:
+                reasons.setdefault(reason, []).append(f)
+
+        if not reasons:
+            return files
+
+        skipped = set()
+
+        # the reason keeps minified, generated and vendored files out of all
+        # statistics, just like the faulty flag does for failed files
+        for reason, filtered in reasons.iteritems():
+            self.mark(filtered, filtered=reason)
+
+            skipped.update(f.id for f in filtered)
+
+        return [f for f in files if not f.id in skipped]
 
-                    self.store_results(revision, results)
+    def skip_quarantined(self, analyzer, hashes):
+        quarantined = self.quarantine.lookup(analyzer.checker, hashes.values())
+
+        if not quarantined:
+            return
+
+        self.mark([f for f in analyzer.files if hashes.get(f.full_path()) in quarantined], faulty=True)
+
+        analyzer.files = [f for f in analyzer.files if not hashes.get(f.full_path()) in quarantined]
+
+    def mark(self, files, chunk_size=500, **values):
+        cls = files[0].__class__
+
+        for i in range(0, len(files), chunk_size):
+            chunk = files[i:i + chunk_size]
+
+            cls.objects.filter(id__in=[f.id for f in chunk]).update(**values)
+
+        for f in files:
+            for key, value in values.iteritems():
+                setattr(f, key, value)
+
+    def store(self, revision, results, entries=()):
+        self.store_results(revision, results)
+
+        for checker, measures in entries:
+            self.cache.add(checker, measures)
+
+    def measure(self, revision):
+        results, entries = self.collect(revision)
+
+        self.store(revision, results, entries)
+
+    def measure_cached(self, revision, analyzer, hashes):
+        files = []
+
+        cached = self.cache.lookup(analyzer.checker, hashes.values())
+        results = {}
+
+        for f in analyzer.files:
+            content_hash = hashes.get(f.full_path())
+
+            if content_hash in cached:
+                results[f.full_path()] = cached[content_hash]
+            else:
+                files.append(f)
+
+        analyzer.files = files
+
+        if analyzer.empty():
+            return results, {}
+
+        measured = analyzer.measure(revision, self.connector)
+
+        if not measured:
+            return results, {}
+
+        results.update(measured)
+
+        # cacheable checkers report the exact paths they have been given
+        measures = dict(
+            (hashes[filename], values) for filename, values in measured.iteritems() if filename in hashes
+        )
+
+        return results, measures
 
     def store_results(self, revision, results):
         if not results:
@@ -88,13 +249,30 @@ class Analyzer(object):
         f = None
 
         try:
+            files = revision.get_files(results.keys())
+            previous = {}
+
+            if self.worker is None:
+                previous = revision.get_previous_files(files.values())
+
             for filename, measures in results.iteritems():
-                f = revision.get_file(filename)
-                f.add_measures(measures)
+                f = files[filename]
+                f.set_measures(measures)
+
+                if self.worker is None:
+                    f.set_deltas(previous.get(f.id))
+                else:
+                    self.measured_files.append(f.id)
 
-                code_churn = self.connector.get_churn(revision, f)
+                # churn recorded while ingesting the history
+                if f.has_churn():
+                    continue
 
-                f.add_churn(code_churn)
+                f.set_churn(self.connector.get_churn(revision, f))
+
+            f = None
+
+            revision.store_files(files.values())
         except Exception, e:
             self.connector.unlock()
 
@@ -102,30 +280,237 @@ class Analyzer(object):
 
         self.connector.unlock()
 
+    def measure_revision(self, revision, flag=True):
+        try:
+            self.connector.prepare(revision, revision.modified_files())
+            self.measure(revision)
+        except pysvn.ClientError:
+            # happens if branch structure is fucked up
+            pass
+
+        if not flag:
+            return
+
+        revision.measured = True
+        revision.save()
+
+    def planned(self, revisions, chunk_size=100):
+        cls = self.branch.revisions.model
+
+        for i in range(0, len(revisions), chunk_size):
+            chunk = revisions[i:i + chunk_size]
+            loaded = cls.objects.in_bulk(chunk)
+
+            for pk in chunk:
+                yield loaded[pk]
+
     def start(self, revision=None):
         self.connector.switch_to(self.branch)
 
-        if not revision:
-            revision = self.branch.first_revision()
+        # revisions that were measured before are skipped, whether they
+        # have been measured in an earlier run or have nothing to measure
+        revisions = self.planned(self.branch.plan_measure(revision))
+
+        try:
+            # the results are stored by another thread while the checked
+            # files are marked, which needs more than a single writer
+            if MEASURE_PIPELINE and sql.supports_concurrent_writes():
+                self.pipeline(revisions)
+            else:
+                for revision in revisions:
+                    self.measure_revision(revision)
+        finally:
+            self.connector.close()
+
+    def put(self, queue, item, stop):
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=1)
+
+                return True
+            except Full:
+                pass
 
-        while revision:
+        return False
+
+    def get(self, queue, stop):
+        while not stop.is_set():
             try:
-                self.connector.checkout(revision)
-                self.measure(revision)
-            except pysvn.ClientError:
-                # happens if branch structure is fucked up
+                return queue.get(timeout=1)
+            except Empty:
                 pass
 
-            revision.measured = True
-            revision.save()
+        return None
+
+    # prepares the next revisions and stores the previous ones in background
+    # threads. Results are stored in chain order, so the measured flags never
+    # skip a revision
+    def pipeline(self, revisions, depth=MEASURE_PIPELINE_DEPTH):
+        prefetch = self.connector.prefetches()
+
+        # a slot must not be prepared again before its revision is measured
+        slots = depth + 2
+
+        prepared = Queue(maxsize=depth)
+        measured = Queue(maxsize=depth)
+
+        stop = threading.Event()
+        errors = []
+
+        def guard(target):
+            try:
+                target()
+            except Exception:
+                errors.append(sys.exc_info())
+                stop.set()
+            finally:
+                connection.close()
+
+        def prepare():
+            for index, revision in enumerate(revisions):
+                files = list(revision.modified_files())
+                slot = index % slots
+
+                if prefetch:
+                    self.connector.prepare(revision, files, slot=slot)
+
+                if not self.put(prepared, (revision, files, slot), stop):
+                    return
+
+            self.put(prepared, None, stop)
+
+        def store():
+            while True:
+                item = self.get(measured, stop)
+
+                if not item:
+                    return
+
+                revision, results, entries = item
+
+                self.store(revision, results, entries)
+
+                revision.measured = True
+                revision.save()
+
+        threads = [
+            threading.Thread(target=guard, args=(prepare,)),
+            threading.Thread(target=guard, args=(store,))
+        ]
+
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        def run():
+            while True:
+                item = self.get(prepared, stop)
 
-            revision = revision.next
+                if not item:
+                    break
+
+                revision, files, slot = item
+
+                results, entries = {}, []
+
+                try:
+                    if prefetch:
+                        self.connector.select(slot)
+                    else:
+                        self.connector.prepare(revision, files)
+
+                    results, entries = self.collect(revision, files)
+                except pysvn.ClientError:
+                    # happens if branch structure is fucked up
+                    pass
+
+                if not self.put(measured, (revision, results, entries), stop):
+                    return
+
+            self.put(measured, None, stop)
+
+        try:
+            run()
+        except Exception:
+            errors.append(sys.exc_info())
+            stop.set()
+
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            error_type, error, tb = errors[0]
+
+            raise error_type, error, tb
+
+    # one contiguous range per process, measured in its own working copy.
+    # The deltas of a range are computed once all ranges before it are done,
+    # only then its revisions are flagged as measured
+    def start_parallel(self, revision=None, workers=MEASURE_WORKERS, chunk_size=500):
+        self.connector.switch_to(self.branch)
+
+        revisions = self.branch.plan_measure(revision)
+        size = max(1, (len(revisions) + workers - 1) / workers)
+
+        tasks = [
+            (self.branch.id, worker, revisions[worker * size:(worker + 1) * size])
+            for worker in range(workers)
+        ]
+
+        # forked processes must not share the connection of their parent
+        connection.close()
+
+        pool = Pool(workers)
+
+        try:
+            # results arrive in the order of the history
+            for index, files in enumerate(pool.imap(measure_revisions, tasks)):
+                measured = tasks[index][2]
+
+                self.branch.compute_deltas(files)
+
+                for i in range(0, len(measured), chunk_size):
+                    self.branch.revisions.filter(id__in=measured[i:i + chunk_size]).update(measured=True)
+        finally:
+            pool.close()
+            pool.join()
+
+    def run(self, revisions):
+        self.connector.attach_worker(self.branch, self.worker)
+
+        try:
+            for revision in revisions:
+                # revisions are flagged once their deltas are computed
+                self.measure_revision(revision, flag=False)
+        finally:
+            self.connector.close()
+
+        return self.measured_files
+
+
+def measure_revisions(task):
+    # runs inside of a worker process
+    from parsr.models import Branch, Revision
+
+    branch_id, worker, revisions = task
+
+    try:
+        branch = Branch.objects.get(pk=branch_id)
+        analyzer = branch.create_analyzer(worker)
+
+        return analyzer.run(Revision.objects.get(pk=revision) for revision in revisions)
+    except Exception:
+        # errors must be picklable in order to reach the parent process
+        raise RuntimeError(traceback.format_exc())
+    finally:
+        connection.close()
 
 
 class BaseAnalyzer(object):
 
     def __init__(self, checker):
         self.files = []
+        self.timeouts = []
         self.checker = checker
 
     def __str__(self):
@@ -135,8 +520,8 @@ class BaseAnalyzer(object):
         self.files.append(f)
 
     def setup_paths(self, connector):
-        config_path = "%s/%s/configs" % (RESULT_PATH, connector.repo_id())
-        result_path = "%s/%s/results" % (RESULT_PATH, connector.repo_id())
+        config_path = "%s/%s/configs" % (RESULT_PATH, connector.work_id())
+        result_path = "%s/%s/results" % (RESULT_PATH, connector.work_id())
 
         if not os.path.exists(config_path):
             os.makedirs(config_path)
@@ -154,6 +539,7 @@ class BaseAnalyzer(object):
 
     def clear(self):
         self.files = []
+        self.timeouts = []
 
     def measure(self, revision, connector):
         config_path, result_path = self.setup_paths(connector)
@@ -168,6 +554,8 @@ class BaseAnalyzer(object):
 
         self.cleanup(config_path, result_path)
 
+        self.timeouts = checker.timeouts
+
         return results
 
     def empty(self):
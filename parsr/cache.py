@@ -0,0 +1,100 @@
+import json
+
+from decimal import Decimal
+
+from django.db import transaction, IntegrityError
+
+
+class MeasureCache(object):
+    """
+    Content addressed store for the measures of single files. Contents
+    which reappear after reverts, renames or on other branches are looked
+    up instead of being measured again.
+    """
+
+    def __init__(self, cls, chunk_size=500):
+        self.cls = cls
+        self.chunk_size = chunk_size
+
+    def get_key(self, checker):
+        return checker.__name__, checker.get_version()
+
+    def dump(self, measures):
+        return json.dumps(dict((key, "%s" % value) for key, value in measures.iteritems()))
+
+    def load(self, measures):
+        return dict((key, Decimal(value)) for key, value in json.loads(measures).iteritems())
+
+    def lookup(self, checker, hashes):
+        name, version = self.get_key(checker)
+        hashes = list(set(hashes))
+
+        found = {}
+
+        for i in range(0, len(hashes), self.chunk_size):
+            entries = self.cls.objects.filter(
+                checker=name,
+                version=version,
+                content_hash__in=hashes[i:i + self.chunk_size]
+            )
+
+            for entry in entries:
+                found[entry.content_hash] = self.load(entry.measures)
+
+        return found
+
+    def add(self, checker, measures):
+        if not measures:
+            return
+
+        name, version = self.get_key(checker)
+        known = self.lookup(checker, measures.keys())
+
+        entries = [
+            self.cls(content_hash=content_hash, checker=name, version=version, measures=self.dump(values))
+            for content_hash, values in measures.iteritems() if not content_hash in known
+        ]
+
+        try:
+            with transaction.atomic():
+                self.cls.objects.bulk_create(entries)
+        except IntegrityError:
+            # another worker stored some of the contents in the meantime
+            for entry in entries:
+                try:
+                    with transaction.atomic():
+                        entry.save()
+                except IntegrityError:
+                    pass
+
+
+class Quarantine(object):
+    """
+    Persistent list of contents which exceeded the limits of a checker.
+    Such contents are marked as faulty without running the checker again.
+    """
+
+    def __init__(self, cls, chunk_size=500):
+        self.cls = cls
+        self.chunk_size = chunk_size
+
+    def lookup(self, checker, hashes):
+        hashes = list(set(hashes))
+        found = set()
+
+        for i in range(0, len(hashes), self.chunk_size):
+            found.update(self.cls.objects.filter(
+                checker=checker.__name__,
+                content_hash__in=hashes[i:i + self.chunk_size]
+            ).values_list("content_hash", flat=True))
+
+        return found
+
+    def add(self, checker, hashes):
+        for content_hash in set(hashes):
+            try:
+                with transaction.atomic():
+                    self.cls.objects.get_or_create(content_hash=content_hash, checker=checker.__name__)
+            except IntegrityError:
+                # quarantined by another worker in the meantime
+                pass
@@ -1,15 +1,20 @@
 import subprocess
 import json
 import math
+import os
 import re
+import signal
+import tempfile
+import threading
 
 import lizard
 
 from jinja2 import Environment, FileSystemLoader
-from xml.dom import minidom
+from xml.etree import cElementTree
 from decimal import Decimal
 
-from analyzr.settings import CONFIG_PATH, PROJECT_PATH, LAMBDA
+from analyzr.settings import CONFIG_PATH, PROJECT_PATH, LAMBDA, COMPLEXITY_REPORT_WORKER, JHAWK_WHOLE_REVISION
+from analyzr.settings import CHECKER_TIMEOUT, CHECKER_CPU_LIMIT, CHECKER_MEMORY_LIMIT
 
 XML_ILLEGAL = u'([\u0000-\u0008\u000b-\u000c\u000e-\u001f\ufffe-\uffff])|([%s-%s][^%s-%s])|([^%s-%s][%s-%s])|([%s-%s]$)|(^[%s-%s])'
 RE_XML_ILLEGAL = XML_ILLEGAL % (
@@ -55,8 +60,271 @@ class CheckerException(Exception):
         return self.__unicode__()
 
 
+class CheckerTimeout(CheckerException):
+
+    def __init__(self, checker, cmd, timeout, stdout="", stderr=""):
+        self.timeout = timeout
+
+        super(CheckerTimeout, self).__init__(checker, cmd, stdout=stdout, stderr=stderr)
+
+    def __str__(self):
+        return "%s exceeded its limit of %s seconds while running command:\n\n%s" % (
+            self.checker,
+            self.timeout,
+            " ".join(self.cmd)
+        )
+
+
+# the shell applies the limits right before the checker starts, a
+# preexec_fn is not safe while other threads are running. The own
+# process group allows to kill everything the checker started
+def limited(cmd, cpu=True):
+    limits = []
+
+    if CHECKER_MEMORY_LIMIT:
+        limits.append("ulimit -v %d" % (CHECKER_MEMORY_LIMIT * 1024))
+
+    if cpu and CHECKER_CPU_LIMIT:
+        # the soft limit sends SIGXCPU, the hard limit kills the process
+        limits.append("ulimit -H -t %d" % (CHECKER_CPU_LIMIT + 1))
+        limits.append("ulimit -S -t %d" % CHECKER_CPU_LIMIT)
+
+    return ["setsid", "sh", "-c", "; ".join(limits + ['exec "$@"']), "sh"] + list(cmd)
+
+
+def kill(proc, expired):
+    expired.set()
+
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except OSError:
+        # already finished
+        pass
+
+
+# replaces characters that are not allowed in XML while reading
+class XMLSanitizer(object):
+
+    def __init__(self, f):
+        self.f = f
+        self.buffer = ""
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            line = self.f.readline()
+
+            if not line:
+                break
+
+            line = re.sub(RE_XML_ILLEGAL, "?", line.decode("utf-8", "replace"))
+            self.buffer = self.buffer + line.encode("utf-8")
+
+        if size < 0:
+            size = len(self.buffer)
+
+        data = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+
+        return data
+
+
+# trie over the reversed components of paths, finds the paths ending
+# with a given path
+class SuffixIndex(object):
+
+    def __init__(self, paths=()):
+        self.root = {
+            "paths": [],
+            "children": {}
+        }
+
+        for path in paths:
+            self.add(path)
+
+    def parts(self, path):
+        return [part for part in reversed(path.split("/")) if part]
+
+    def add(self, path):
+        node = self.root
+
+        for part in self.parts(path):
+            if not part in node["children"]:
+                node["children"][part] = {
+                    "paths": [],
+                    "children": {}
+                }
+
+            node = node["children"][part]
+            node["paths"].append(path)
+
+    def find(self, path):
+        node = self.root
+
+        for part in self.parts(path):
+            node = node["children"].get(part)
+
+            if not node:
+                return []
+
+        return node["paths"]
+
+
+class WorkerCrashed(Exception):
+
+    def __init__(self, script, stderr=""):
+        self.script = script
+        self.stderr = stderr
+
+        super(WorkerCrashed, self).__init__(script)
+
+
+class WorkerTimeout(WorkerCrashed):
+    pass
+
+
+# long running node process, one JSON document per line each way. A
+# crashed process is replaced on the next request
+class NodeWorker(object):
+
+    # only the end of the error output is kept for the report
+    STDERR_SIZE = 4096
+
+    def __init__(self, script):
+        self.script = script
+        self.proc = None
+        self.stderr = None
+        self.counter = 0
+
+        # whether the worker has answered any request yet
+        self.working = False
+
+    def start(self):
+        # a file keeps the error output without ever blocking the worker
+        self.stderr = tempfile.TemporaryFile()
+
+        # the cpu limit would add up over all requests, so only the
+        # memory is limited
+        self.proc = subprocess.Popen(limited(["node", self.script], cpu=False),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=self.stderr,
+            close_fds=True)
+
+    def read_stderr(self):
+        if not self.stderr:
+            return ""
+
+        if self.proc:
+            # the output is complete once the process is gone
+            if self.proc.poll() is None:
+                self.proc.kill()
+
+            self.proc.wait()
+
+        self.stderr.seek(0, os.SEEK_END)
+        self.stderr.seek(max(0, self.stderr.tell() - self.STDERR_SIZE))
+
+        return self.stderr.read()
+
+    def crashed(self):
+        stderr = self.read_stderr()
+
+        self.stop()
+
+        return WorkerCrashed(self.script, stderr)
+
+    def stop(self):
+        proc = self.proc
+        self.proc = None
+
+        if self.stderr:
+            self.stderr.close()
+            self.stderr = None
+
+        if not proc:
+            return
+
+        try:
+            proc.stdin.close()
+            proc.stdout.close()
+        except IOError:
+            pass
+
+        if proc.poll() is None:
+            proc.kill()
+
+        proc.wait()
+
+    def request(self, timeout=None, **kwargs):
+        if not self.proc or not self.proc.poll() is None:
+            self.start()
+
+        self.counter = self.counter + 1
+        kwargs["id"] = self.counter
+
+        expired = threading.Event()
+        timer = None
+
+        if timeout:
+            timer = threading.Timer(timeout, kill, [self.proc, expired])
+            timer.start()
+
+        try:
+            self.proc.stdin.write("%s\n" % json.dumps(kwargs))
+            self.proc.stdin.flush()
+
+            line = self.proc.stdout.readline()
+        except IOError:
+            line = None
+        finally:
+            if timer:
+                timer.cancel()
+
+        if expired.is_set():
+            self.stop()
+
+            raise WorkerTimeout(self.script)
+
+        if not line:
+            raise self.crashed()
+
+        response = json.loads(line)
+
+        if not response.get("id") == self.counter:
+            # out of sync. the answers can't be trusted anymore
+            self.stop()
+
+            raise WorkerCrashed(self.script)
+
+        self.working = True
+
+        return response
+
+
 class Checker(object):
 
+    # must be raised whenever the measures of a checker change so that
+    # cached measures are not reused
+    VERSION = "1"
+
+    # whether the measures of a file only depend on its content
+    CACHEABLE = True
+
+    @classmethod
+    def get_version(cls):
+        tool_version = cls.get_tool_version()
+
+        if not tool_version:
+            return "%s:%s" % (cls.VERSION, LAMBDA)
+
+        return "%s:%s:%s" % (cls.VERSION, LAMBDA, tool_version)
+
+    @classmethod
+    def get_tool_version(cls):
+        # installed version and mode of the tool doing the measuring, so
+        # that upgrades don't reuse the measures of the old one
+        return None
+
     def __init__(self, config_path, result_path):
         self.measures = {}
         self.env = Environment(loader=FileSystemLoader(CONFIG_PATH))
@@ -66,27 +334,52 @@ class Checker(object):
 
         self.files = []
 
+        # files which exceeded the limits of the checker
+        self.timeouts = []
+
     def __str__(self):
         return self.__unicode__()
 
-    def includes(self, filename):
-        for f in self.files:
-            if f.endswith(filename):
-                return True
+    def get_index(self):
+        if not getattr(self, "index", None):
+            self.index = SuffixIndex(self.files)
 
-        return False
+        return self.index
+
+    def includes(self, filename):
+        return len(self.get_index().find(filename)) > 0
 
     def get_decimal(self, value):
         return Decimal("%s" % round(float(value), 2))
 
-    def execute(self, cmd):
+    def execute(self, cmd, timeout=CHECKER_TIMEOUT):
         # close_fds must be true as python would otherwise reuse created
         # file handles. this would cause a serious memory leak.
         # btw: the file handles are craeted because we pipe stdout and
         # stderr to them.
-        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, close_fds=True)
+        proc = subprocess.Popen(limited(cmd),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            close_fds=True)
 
-        stdout, stderr = proc.communicate()
+        expired = threading.Event()
+        timer = None
+
+        if timeout:
+            timer = threading.Timer(timeout, kill, [proc, expired])
+            timer.start()
+
+        try:
+            stdout, stderr = proc.communicate()
+        finally:
+            if timer:
+                timer.cancel()
+
+        if expired.is_set():
+            raise CheckerTimeout(self, cmd, timeout, stdout=stdout, stderr=stderr)
+
+        if proc.returncode == -signal.SIGXCPU:
+            raise CheckerTimeout(self, cmd, CHECKER_CPU_LIMIT, stdout=stdout, stderr=stderr)
 
         if not proc.returncode == 0:
             raise CheckerException(self, cmd, stdout=stdout, stderr=stderr)
@@ -187,12 +480,19 @@ class JHawk(Checker):
     # be parsed.
     FILE_BATCH_SIZE = 50
 
+    # set by the first successful run of the process
+    working = False
+
+    # fan in and fan out depend on the other classes of the run
+    CACHEABLE = False
+
     def __init__(self, config_path, result_path):
         super(JHawk, self).__init__(config_path, result_path)
 
         self.name = "jhawk"
         self.files = []
-        self.configurations = []
+        self.sources = {}
+        self.chunks = []
         self.results = []
 
     def config_file(self, revision, part):
@@ -201,85 +501,197 @@ class JHawk(Checker):
     def result_file(self, revision, part):
         return "%s/%s_%d" % (self.result_path, revision.identifier, part)
 
+    def get_batch_size(self, files):
+        if JHAWK_WHOLE_REVISION:
+            # the report is streamed so its size does not matter anymore
+            return max(len(files), 1)
+
+        return self.FILE_BATCH_SIZE
+
+    def get_properties(self):
+        if JHAWK_WHOLE_REVISION:
+            return "%slean" % self.name
+
+        return self.name
+
     def configure(self, files, revision, connector):
         for f in files:
             self.files.append(f.full_path())
+            self.sources[f.full_path()] = f
+
+        self.index = None
 
         self.measures = {}
-        self.configurations = []
+        self.chunks = []
         self.results = []
+        self.parts = 0
 
-        template = self.env.get_template("%s.xml" % self.name)
+        self.base_path = connector.get_source_path()
+        self.revision = revision
+
+        batch_size = self.get_batch_size(files)
 
         file_count = len(files)
-        chunks = int(math.ceil(file_count / self.FILE_BATCH_SIZE))
+        chunks = int(math.ceil(file_count / batch_size))
 
-        if not file_count % self.FILE_BATCH_SIZE == 0:
+        if not file_count % batch_size == 0:
             chunks = chunks + 1
 
         for i in range(chunks):
-            start = i * self.FILE_BATCH_SIZE
-            end = min((i + 1) * self.FILE_BATCH_SIZE, file_count)
+            start = i * batch_size
+            end = min((i + 1) * batch_size, file_count)
 
-            chunk = files[start:end]
+            self.chunks.append(files[start:end])
 
-            filename = self.config_file(revision, i)
-            result_file = self.result_file(revision, i)
+    def write_configuration(self, chunk):
+        template = self.env.get_template("%s.xml" % self.name)
 
-            options = {
-                "checker": self.name,
-                "project_path": PROJECT_PATH,
-                "base_path": connector.get_repo_path(),
-                "target": result_file,
-                "filepattern": "|".join([".*/%s" % f.name for f in chunk])
-            }
+        filename = self.config_file(self.revision, self.parts)
+        result_file = self.result_file(self.revision, self.parts)
 
-            with open(filename, "wb") as f:
-                f.write(template.render(options))
+        self.parts = self.parts + 1
 
-            self.configurations.append(filename)
-            self.results.append(result_file)
+        options = {
+            "checker": self.name,
+            "properties": self.get_properties(),
+            "project_path": PROJECT_PATH,
+            "base_path": self.base_path,
+            "target": result_file,
+            "filepattern": "|".join([".*/%s" % f.name for f in chunk])
+        }
 
-        self.revision = revision
+        with open(filename, "wb") as f:
+            f.write(template.render(options))
 
-    def run(self):
-        for configuration in self.configurations:
-            cmd = [
-                "ant",
-                "-lib", "%s/lib/%s/JHawkCommandLine.jar" % (PROJECT_PATH, self.name),
-                "-f", configuration
-            ]
+        return filename, result_file
+
+    # returns the number of files marked as faulty, raises the errors that
+    # can't be blamed on a single file
+    def run_chunk(self, chunk):
+        configuration, result_file = self.write_configuration(chunk)
+
+        cmd = [
+            "ant",
+            "-lib", "%s/lib/%s/JHawkCommandLine.jar" % (PROJECT_PATH, self.name),
+            "-f", configuration
+        ]
 
+        try:
             self.execute(cmd)
+        except CheckerException, e:
+            if len(chunk) > 1:
+                return self.bisect(chunk, e)
+
+            if not JHawk.working and not isinstance(e, CheckerTimeout):
+                # without any successful run the setup might be broken
+                raise
+
+            self.mark_faulty(chunk[0], e)
+
+            return 1
+
+        JHawk.working = True
+
+        self.results.append(result_file)
+
+        return 0
+
+    def bisect(self, chunk, error):
+        # narrow the failure down by running both halves on their own
+        half = len(chunk) / 2
+
+        faulty = 0
+        failures = []
+
+        for part in [chunk[:half], chunk[half:]]:
+            try:
+                faulty = faulty + self.run_chunk(part)
+            except CheckerException, e:
+                if len(part) > 1:
+                    # the half could not be narrowed down any further
+                    raise
+
+                failures.append((part, e))
+
+        if len(failures) == 2:
+            # a broken setup or a lack of memory lets every run fail
+            raise error
+
+        if not failures:
+            if not faulty and not isinstance(error, CheckerTimeout):
+                # no file is to blame when only the whole chunk fails
+                raise error
+
+            # a chunk that only took too long is measured by its halves
+
+            return faulty
+
+        part, e = failures[0]
+
+        # found the file that breaks jhawk while its sibling works
+        self.mark_faulty(part[0], e)
+
+        return faulty + 1
+
+    def mark_faulty(self, f, error):
+        f.faulty = True
+        f.save()
+
+        if isinstance(error, CheckerTimeout):
+            self.timeouts.append(f)
+
+    def run(self):
+        for chunk in self.chunks:
+            self.run_chunk(chunk)
 
         # Don't allow multiple runs with the same configuration
-        self.configurations = []
+        self.chunks = []
 
         return True
 
-    def get_metrics(self, parent):
-        for node in parent.childNodes:
-            if node.localName == "Metrics":
+    def local_name(self, node):
+        return node.tag.rsplit("}", 1)[-1]
+
+    def get_child(self, parent, node_name):
+        for node in parent:
+            if self.local_name(node) == node_name:
                 return node
 
+    def get_metrics(self, parent):
+        return self.get_child(parent, "Metrics")
+
     def get_node_value(self, parent, node_name):
-        for node in parent.childNodes:
-            if node.localName == node_name:
-                return node.firstChild.nodeValue
+        node = self.get_child(parent, node_name)
+
+        if node is not None:
+            return node.text
 
     def get_number(self, parent, node_name):
         return float(self.get_node_value(parent, node_name))
 
-    def get_name(self, parent):
-        return self.get_node_value(parent, "Name")
+    def get_methods(self, cls):
+        methods = []
+
+        for node in cls.iter():
+            if not self.local_name(node) == "Method":
+                continue
+
+            metrics = self.get_metrics(node)
+
+            methods.append({
+                "loc": self.get_number(metrics, "loc"),
+                "halsteadVolume": self.get_number(metrics, "halsteadVolume"),
+                "halsteadEffort": self.get_number(metrics, "halsteadEffort"),
+                "cyclomaticComplexity": self.get_number(metrics, "cyclomaticComplexity")
+            })
+
+        return methods
 
     def get_sloc_squale(self, methods):
         marks = []
 
         for method in methods:
-            metrics = self.get_metrics(method)
-
-            marks.append(self.get_sloc_mark(self.get_number(metrics, "loc")))
+            marks.append(self.get_sloc_mark(method["loc"]))
 
         return self.squale(marks)
 
@@ -287,9 +699,7 @@ class JHawk(Checker):
         marks = []
 
         for method in methods:
-            metrics = self.get_metrics(method)
-
-            marks.append(self.get_hv_mark(self.get_number(metrics, "halsteadVolume")))
+            marks.append(self.get_hv_mark(method["halsteadVolume"]))
 
         return self.squale(marks)
 
@@ -297,10 +707,8 @@ class JHawk(Checker):
         marks = []
 
         for method in methods:
-            metrics = self.get_metrics(method)
-
-            volume = self.get_number(metrics, "halsteadVolume")
-            effort = self.get_number(metrics, "halsteadEffort")
+            volume = method["halsteadVolume"]
+            effort = method["halsteadEffort"]
 
             difficulty = effort / volume
 
@@ -313,81 +721,121 @@ class JHawk(Checker):
         marks = []
 
         for method in methods:
-            metrics = self.get_metrics(method)
-
-            marks.append(self.get_cc_mark(self.get_number(metrics, "cyclomaticComplexity")))
+            marks.append(self.get_cc_mark(method["cyclomaticComplexity"]))
 
         return self.squale(marks)
 
-    def mark_faults(self, processed):
-        for f in self.files:
-            found = False
+    def mark_faults(self, processed, chunk_size=500):
+        index = self.get_index()
+        found = set()
 
-            for p in processed:
-                if found:
-                    continue
+        for p in processed:
+            found.update(index.find(p))
 
-                if f.endswith(p):
-                    found = True
+        # All files should have been processed but weren't must contain
+        # some kind of error
+        errors = [self.sources[f] for f in self.files if not f in found]
 
-                    continue
+        if not errors:
+            return
 
-            if not found:
-                # All files should have been processed but weren't must contain
-                # some kind of error
-                error = self.revision.get_file(f)
-                error.faulty = True
-                error.save()
+        cls = errors[0].__class__
 
-    def parse(self, connector):
-        processed = []
+        for i in range(0, len(errors), chunk_size):
+            chunk = errors[i:i + chunk_size]
 
-        for result in self.results:
-            with open("%s.xml" % result, "r") as f:
-                content = f.read()
+            cls.objects.filter(id__in=[error.id for error in chunk]).update(faulty=True)
 
-            content = re.sub(RE_XML_ILLEGAL, "?", content)
-            xml_doc = minidom.parseString(content.encode("utf-8"))
-            packages = xml_doc.getElementsByTagName("Package")
+        for error in errors:
+            error.faulty = True
 
-            for package in packages:
-                name = self.get_name(package)
-                classes = package.getElementsByTagName("Class")
+    def read_class(self, cls):
+        class_metrics = self.get_metrics(cls)
 
-                path = name.replace(".", "/")
+        return {
+            "name": self.get_node_value(cls, "ClassName"),
+            "methods": self.get_methods(cls),
+            "loc": self.get_node_value(class_metrics, "loc"),
+            "fanIn": self.get_number(class_metrics, "fanIn"),
+            "fanOut": self.get_number(class_metrics, "fanOut")
+        }
 
-                for cls in classes:
-                    class_metrics = self.get_metrics(cls)
-                    class_name = self.get_node_value(cls, "ClassName")
+    def add_class(self, path, cls, processed):
+        if "$" in cls["name"]:
+            # private class inside of class
+            # ignore!
+            return
+
+        filename = "%s/%s.java" % (path, cls["name"])
+
+        if not self.includes(filename):
+            return
+
+        processed.append(filename)
+
+        methods = cls["methods"]
+
+        if len(methods) == 0:
+            return
 
-                    if "$" in class_name:
-                        # private class inside of class
-                        # ignore!
-                        continue
+        self.add_halstead_metrics(filename, methods)
 
-                    filename = "%s/%s.java" % (path, class_name)
+        self.set(filename, "cyclomatic_complexity", self.get_cc_squale(methods))
+        self.set(filename, "sloc", self.get_sloc_squale(methods))
+        self.set(filename, "sloc_absolute", cls["loc"])
 
-                    if not self.includes(filename):
-                        continue
+        self.set(filename, "fan_in", self.get_fan_in_mark(cls["fanIn"]))
+        self.set(filename, "fan_out", self.get_fan_out_mark(cls["fanOut"]))
 
-                    processed.append(filename)
+    # classes are dropped right after they are read, so memory does not
+    # grow with the size of the report
+    def parse_report(self, report, processed):
+        path = None
+        classes = []
 
-                    methods = cls.getElementsByTagName("Method")
+        stack = []
+        depth = 0
 
-                    if len(methods) == 0:
-                        continue
+        for event, node in cElementTree.iterparse(report, events=("start", "end")):
+            name = self.local_name(node)
 
-                    self.add_halstead_metrics(filename, methods)
+            if event == "start":
+                stack.append(name)
 
-                    self.set(filename, "cyclomatic_complexity", self.get_cc_squale(methods))
-                    self.set(filename, "sloc", self.get_sloc_squale(methods))
-                    self.set(filename, "sloc_absolute", self.get_node_value(class_metrics, "loc"))
+                if name == "Class":
+                    depth = depth + 1
 
-                    fan_in = self.get_number(class_metrics, "fanIn")
-                    fan_out = self.get_number(class_metrics, "fanOut")
+                continue
+
+            stack.pop()
+
+            if name == "Name" and stack and stack[-1] == "Package":
+                path = (node.text or "").replace(".", "/")
+
+            if name == "Class":
+                depth = depth - 1
+
+                classes.append(self.read_class(node))
+
+                # nested classes are part of the methods of their outer class
+                if depth == 0:
+                    node.clear()
+
+            if name == "Package":
+                for cls in classes:
+                    self.add_class(path, cls, processed)
+
+                path = None
+                classes = []
 
-                    self.set(filename, "fan_in", self.get_fan_in_mark(fan_in))
-                    self.set(filename, "fan_out", self.get_fan_out_mark(fan_out))
+                node.clear()
+
+    def parse(self, connector):
+        processed = []
+
+        for result in self.results:
+            with open("%s.xml" % result, "r") as f:
+                self.parse_report(XMLSanitizer(f), processed)
 
         self.mark_faults(processed)
 
@@ -399,10 +847,48 @@ class JHawk(Checker):
 
 class ComplexityReport(Checker):
 
+    # shared by all instances so that node is only started once per process
+    worker = NodeWorker("%s/lib/complexity-report/worker.js" % PROJECT_PATH)
+
+    # versions of the tools read once per process, by mode
+    tool_versions = {}
+
+    @classmethod
+    def get_tool_version(cls):
+        if COMPLEXITY_REPORT_WORKER:
+            # the engine is resolved the same way the worker resolves it
+            mode = "escomplex-js"
+            cmd = ["node", "-e", 'process.stdout.write(require("escomplex-js/package.json").version)']
+        else:
+            mode = "cr"
+            cmd = ["cr", "--version"]
+
+        if not mode in cls.tool_versions:
+            cls.tool_versions[mode] = "%s %s" % (mode, cls.read_tool_version(cmd))
+
+        return cls.tool_versions[mode]
+
+    @classmethod
+    def read_tool_version(cls, cmd):
+        proc = subprocess.Popen(cmd,
+            cwd=os.path.dirname(cls.worker.script),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            close_fds=True)
+
+        stdout, stderr = proc.communicate()
+
+        if not proc.returncode == 0:
+            # measures of an unknown version must not be cached
+            raise CheckerException(cls.__name__, cmd, stdout=stdout, stderr=stderr)
+
+        return stdout.strip()
+
     def __init__(self, config_path, result_path):
         super(ComplexityReport, self).__init__(config_path, result_path)
 
         self.files = []
+        self.reports = {}
 
     def __unicode__(self):
         return "Complexity Report JavaScript Checker"
@@ -413,13 +899,25 @@ class ComplexityReport(Checker):
     def configure(self, files, revision, connector):
         self.result = self.result_file(revision)
         self.files = files
-        self.base_path = connector.get_repo_path()
+        self.base_path = connector.get_source_path()
 
     def get_file_path(self, f):
         return "%s/%s" % (self.base_path, f.full_path())
 
+    def mark_faulty(self, f):
+        # Ignore syntax errors in checked files
+        self.failed.append(f.get_identifier())
+
+        # mark file as faulty
+        f.faulty = True
+        f.save()
+
     def run(self):
         self.failed = []
+        self.reports = {}
+
+        if COMPLEXITY_REPORT_WORKER:
+            return self.run_worker()
 
         for f in self.files:
             path = self.get_file_path(f)
@@ -429,16 +927,71 @@ class ComplexityReport(Checker):
 
             try:
                 self.execute(cmd)
+            except CheckerTimeout:
+                self.mark_faulty(f)
+                self.timeouts.append(f)
             except CheckerException, e:
                 if not e.stdout.startswith("Fatal error") and not e.stderr.startswith("Fatal error"):
                     raise e
 
-                # Ignore syntax errors in checked files
-                self.failed.append(f.get_identifier())
+                self.mark_faulty(f)
+
+        return True
+
+    def timeout(self, path):
+        return {
+            "error": "Fatal error: worker exceeded its limit of %s seconds while analyzing %s" % (CHECKER_TIMEOUT, path),
+            "fatal": True,
+            "timeout": True
+        }
+
+    def broken(self, error):
+        # a worker that never answered can't be started at all, e.g.
+        # because node or escomplex-js is missing. no file is to blame
+        return CheckerException(self, ["node", self.worker.script], stderr=error.stderr)
+
+    def analyze(self, path):
+        try:
+            return self.worker.request(path=path, timeout=CHECKER_TIMEOUT)
+        except WorkerTimeout:
+            return self.timeout(path)
+        except WorkerCrashed, e:
+            if not self.worker.working:
+                raise self.broken(e)
+
+            # the crash might have been caused by another file, so the
+            # file gets a second chance with a fresh worker
+
+        try:
+            return self.worker.request(path=path, timeout=CHECKER_TIMEOUT)
+        except WorkerTimeout:
+            return self.timeout(path)
+        except WorkerCrashed, e:
+            if not self.worker.working:
+                raise self.broken(e)
+
+            return {
+                "error": "Fatal error: worker crashed while analyzing %s" % path,
+                "fatal": True
+            }
+
+    def run_worker(self):
+        for f in self.files:
+            path = self.get_file_path(f)
+            response = self.analyze(path)
+
+            if "error" in response:
+                if not response.get("fatal"):
+                    raise CheckerException(self, ["node", self.worker.script, path], stderr=response["error"])
+
+                self.mark_faulty(f)
 
-                # mark file as faulty
-                f.faulty = True
-                f.save()
+                if response.get("timeout"):
+                    self.timeouts.append(f)
+
+                continue
+
+            self.reports[f.full_path()] = response["report"]
 
         return True
 
@@ -474,6 +1027,20 @@ class ComplexityReport(Checker):
 
         return self.squale(marks)
 
+    def load_report(self, f):
+        if COMPLEXITY_REPORT_WORKER:
+            return self.reports.get(f.full_path())
+
+        path = "%s_%s.json" % (self.result, f.get_identifier())
+
+        with open(path) as result:
+            contents = json.load(result)
+
+        if not contents or not "reports" in contents or not contents["reports"]:
+            return None
+
+        return contents["reports"][0]
+
     def parse(self, connector):
         for f in self.files:
             identifier = f.get_identifier()
@@ -481,34 +1048,33 @@ class ComplexityReport(Checker):
             if identifier in self.failed:
                 continue
 
-            path = "%s_%s.json" % (self.result, identifier)
-
-            with open(path) as result:
-                contents = json.load(result)
-
-                if not contents or not "reports" in contents or not contents["reports"]:
-                    continue
+            data = self.load_report(f)
 
-                data = contents["reports"][0]
+            if not data:
+                continue
 
-                if len(data["functions"]) == 0:
-                    continue
+            if len(data["functions"]) == 0:
+                continue
 
-                filename = f.full_path()
+            filename = f.full_path()
 
-                functions = data["functions"]
+            functions = data["functions"]
 
-                self.set(filename, "cyclomatic_complexity", self.get_cc_squale(functions))
-                self.set(filename, "halstead_volume", self.get_hv_squale(functions))
-                self.set(filename, "halstead_difficulty", self.get_hd_squale(functions))
-                self.set(filename, "sloc", self.get_sloc_squale(functions))
-                self.set(filename, "sloc_absolute", data["aggregate"]["sloc"]["logical"])
+            self.set(filename, "cyclomatic_complexity", self.get_cc_squale(functions))
+            self.set(filename, "halstead_volume", self.get_hv_squale(functions))
+            self.set(filename, "halstead_difficulty", self.get_hd_squale(functions))
+            self.set(filename, "sloc", self.get_sloc_squale(functions))
+            self.set(filename, "sloc_absolute", data["aggregate"]["sloc"]["logical"])
 
         return self.measures
 
 
 class Lizard(Checker):
 
+    @classmethod
+    def get_tool_version(cls):
+        return "lizard %s" % lizard.version
+
     def __init__(self, config_path, result_path):
         self.files = []
 
@@ -516,7 +1082,7 @@ class Lizard(Checker):
 
     def configure(self, files, revision, connector):
         self.files = files
-        self.path = connector.get_repo_path()
+        self.path = connector.get_source_path()
 
     def run(self):
         for f in self.files:
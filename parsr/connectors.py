@@ -1,24 +1,29 @@
 from datetime import datetime
-from hashlib import md5
+from hashlib import md5, sha1
 from shutil import rmtree
 
 import urllib
 
 import os
 import git
+import glob
 import locale
+import threading
+import subprocess
+
+from multiprocessing.pool import ThreadPool
 
 from pygments import highlight
 from pygments.lexers.text import DiffLexer
 from pygments.formatters import HtmlFormatter
 
-from mercurial import ui, hg, node
+from mercurial import ui, hg, node, commands
 
-from pysvn import Client, Revision
+from pysvn import Client, ClientError, Revision
 from pysvn import opt_revision_kind as revision_kind
 from pysvn import wc_status_kind as svn_status
 
-from analyzr.settings import CHECKOUT_PATH
+from analyzr.settings import CHECKOUT_PATH, GIT_STREAM_LOG, GIT_BLOB_MEASURE, SVN_LOG_WINDOW, SVN_LOG_THREADS, SVN_MIRROR
 
 # The following code is needed in order for the SVN lib to work
 # correctly accross systems. It would otherwise crash if non-standard
@@ -92,6 +97,8 @@ class Connector(object):
 
     def __init__(self, repo):
         self.info = repo
+        self.worker = None
+        self.slot = None
         self.repo = self.create_repo(repo)
 
     def __unicode__(self):
@@ -100,12 +107,26 @@ class Connector(object):
     def create_repo(self, repo):
         raise NotImplementedError
 
-    def analyze(self, branch, resume_at=None):
+    def analyze(self, branch, resume_at=None, since=None):
         raise NotImplementedError
 
     def checkout(self, revision):
         raise NotImplementedError
 
+    # makes the files of a revision available underneath get_source_path()
+    def prepare(self, revision, files, slot=None):
+        self.checkout(revision)
+
+    # whether revisions can be prepared into their own slots ahead of time
+    def prefetches(self):
+        return False
+
+    def select(self, slot):
+        self.slot = slot
+
+    def close(self):
+        pass
+
     def switch_to(self, branch):
         raise NotImplementedError
 
@@ -130,6 +151,44 @@ class Connector(object):
     def get_repo_path(self):
         return "%s/%s" % (CHECKOUT_PATH, self.repo_id())
 
+    def get_worker_path(self, worker):
+        return "%s_worker_%d" % (self.get_repo_path(), worker)
+
+    def get_work_path(self):
+        if self.worker is None:
+            return self.get_repo_path()
+
+        return self.get_worker_path(self.worker)
+
+    def work_id(self):
+        if self.worker is None:
+            return self.repo_id()
+
+        return "%s_%d" % (self.repo_id(), self.worker)
+
+    # following checkouts go to a working copy private to the worker
+    def attach_worker(self, branch, worker):
+        raise NotImplementedError
+
+    def get_source_path(self):
+        return self.get_work_path()
+
+    # hashed like git hashes blobs, so all kinds of repositories share
+    # their cache entries
+    def get_content_hash(self, f):
+        path = "%s/%s" % (self.get_source_path(), f.full_path())
+
+        if not os.path.isfile(path):
+            return None
+
+        digest = sha1("blob %d\0" % os.path.getsize(path))
+
+        with open(path, "rb") as content:
+            for chunk in iter(lambda: content.read(65536), ""):
+                digest.update(chunk)
+
+        return digest.hexdigest()
+
     def update(self, path):
         pass
 
@@ -146,6 +205,9 @@ class Connector(object):
         return os.path.exists(self.get_repo_path())
 
     def clear(self):
+        for path in glob.glob("%s_worker_*" % self.get_repo_path()):
+            rmtree(path)
+
         path = self.get_repo_path()
 
         if not os.path.exists(path):
@@ -156,6 +218,25 @@ class Connector(object):
 
 class Git(Connector):
 
+    # every commit header in the log stream starts with a record separator
+    # and its fields are delimited by unit separators
+    LOG_FORMAT = "%x1e%H%x1f%an%x1f%ae%x1f%at%x1f%s"
+
+    ACTIONS = {
+        "A": Action.ADD,
+        "M": Action.MODIFY,
+        "T": Action.MODIFY,
+        "R": Action.MOVE,
+        "C": Action.MOVE,
+        "D": Action.DELETE
+    }
+
+    def __init__(self, repo):
+        # hashes of the blobs written into every slot
+        self.blobs = {}
+
+        super(Git, self).__init__(repo)
+
     def get_branch_name(self, branch):
         return branch.name.replace("origin/", "")
 
@@ -181,6 +262,132 @@ class Git(Connector):
     def checkout(self, revision):
         self.repo.head.reset(commit=revision.identifier, index=True, working_tree=True)
 
+    def get_scratch_path(self, slot=None):
+        path = "%s_scratch" % self.get_work_path()
+
+        if slot is None:
+            return path
+
+        return "%s_%d" % (path, slot)
+
+    def get_source_path(self):
+        if GIT_BLOB_MEASURE:
+            return self.get_scratch_path(self.slot)
+
+        return self.get_work_path()
+
+    def prefetches(self):
+        return GIT_BLOB_MEASURE
+
+    def attach_worker(self, branch, worker):
+        self.worker = worker
+
+        if GIT_BLOB_MEASURE:
+            # blobs are written into a scratch tree of the worker
+            return
+
+        path = self.get_work_path()
+
+        if not os.path.exists(path):
+            self.repo.git.worktree("prune")
+            self.repo.git.worktree("add", "--detach", path, "HEAD")
+
+        self.repo = git.Repo(path)
+
+    def get_cat_file(self):
+        if not getattr(self, "cat_file", None):
+            self.cat_file = subprocess.Popen(["git", "cat-file", "--batch"],
+                cwd=self.repo.working_dir,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                close_fds=True)
+
+        return self.cat_file
+
+    def read_blob(self, identifier, path):
+        proc = self.get_cat_file()
+
+        proc.stdin.write("%s:%s\n" % (identifier, path.encode("utf-8")))
+        proc.stdin.flush()
+
+        header = proc.stdout.readline()
+
+        if not header:
+            self.close()
+
+            raise ConnectionError("git cat-file terminated unexpectedly", self.info)
+
+        info = header.split()
+
+        if len(info) < 3 or info[-1] == "missing":
+            return None
+
+        content = proc.stdout.read(int(info[2]))
+
+        # every object is terminated by a newline
+        proc.stdout.read(1)
+
+        return info[0], content
+
+    def get_content_hash(self, f):
+        filename = f.full_path().lstrip("/")
+        blobs = self.blobs.get(self.slot, {})
+
+        if filename in blobs:
+            return blobs[filename]
+
+        return super(Git, self).get_content_hash(f)
+
+    def prepare(self, revision, files, slot=None):
+        if not GIT_BLOB_MEASURE:
+            return self.checkout(revision)
+
+        path = self.get_scratch_path(slot)
+        blobs = {}
+
+        if os.path.exists(path):
+            rmtree(path)
+
+        for f in files:
+            # files at the top level have a full path of //name
+            filename = f.full_path().lstrip("/")
+
+            blob = self.read_blob(revision.identifier, filename)
+
+            # only files that are part of the revision are prepared
+            if blob is None:
+                raise ConnectionError("%s is missing in revision %s" % (filename, revision.identifier), self.info)
+
+            blobs[filename], content = blob
+
+            target = "%s/%s" % (path, filename)
+            folder = os.path.dirname(target)
+
+            if not os.path.exists(folder):
+                os.makedirs(folder)
+
+            with open(target, "wb") as handle:
+                handle.write(content)
+
+        self.blobs[slot] = blobs
+
+    def clear(self):
+        super(Git, self).clear()
+
+        for path in glob.glob("%s*" % self.get_scratch_path()):
+            rmtree(path)
+
+    def close(self):
+        proc = getattr(self, "cat_file", None)
+        self.cat_file = None
+
+        if not proc:
+            return
+
+        proc.stdin.close()
+        proc.stdout.close()
+        proc.wait()
+
     def diff(self, left, right):
         parent = self.repo.commit(left.identifier)
         child = self.repo.commit(right.identifier)
@@ -188,7 +395,9 @@ class Git(Connector):
         result = []
 
         diffs = parent.diff(child)
-        stats = child.stats.files
+        stats = None
+
+        churn = dict((f.full_path().lstrip("/"), f) for f in right.files.all())
 
         for diff in diffs:
             filename, action, original = self.parse_diff(diff)
@@ -210,13 +419,22 @@ class Git(Connector):
 
                 diff = self.beauty_diff(diff)
 
-            stat = stats[filename]
+            f = churn.get(filename)
+
+            if f and f.has_churn():
+                added, removed = f.lines_added, f.lines_removed
+            else:
+                if stats is None:
+                    stats = child.stats.files
+
+                stat = stats.get(filename, {"insertions": 0, "deletions": 0})
+                added, removed = stat["insertions"], stat["deletions"]
 
             result.append({
                 "name": filename,
                 "diff": diff,
-                "lines_added": stat["insertions"],
-                "lines_removed": stat["deletions"]
+                "lines_added": added,
+                "lines_removed": removed
             })
 
         return result
@@ -244,10 +462,7 @@ class Git(Connector):
 
         stats = self.commit.stats.files
 
-        filename = f.full_path()
-
-        if filename.startswith("/"):
-            filename = filename.replace("/", "", 1)
+        filename = f.full_path().lstrip("/")
 
         if not filename in stats:
             return
@@ -296,8 +511,7 @@ class Git(Connector):
 
         if not parent:
             for filename, info in stats.files.iteritems():
-                revision.add_file(filename, Action.ADD)
-                revision.save()
+                revision.add_file(filename, Action.ADD, churn=info)
 
             return revision
 
@@ -306,13 +520,198 @@ class Git(Connector):
         for diff in diffs:
             filename, action, original = self.parse_diff(diff)
 
-            revision.add_file(filename, action, original=original)
+            revision.add_file(filename, action, original=original, churn=stats.files.get(filename))
 
-        revision.save()
+        return revision
+
+    def decode(self, value):
+        return value.decode("utf-8", "replace")
+
+    def unquote_path(self, path):
+        # git quotes paths containing control characters, quotes or
+        # backslashes even when core.quotepath is turned off
+        if path.startswith('"') and path.endswith('"'):
+            path = path[1:-1].decode("string_escape")
+
+        return self.decode(path)
+
+    def parse_raw(self, line):
+        info, paths = line.split("\t", 1)
+        status = info.split()[-1]
+
+        action = self.ACTIONS.get(status[0], Action.MODIFY)
+        paths = [self.unquote_path(path) for path in paths.split("\t")]
+
+        original = None
+        filename = paths[-1]
+
+        if action == Action.MOVE:
+            original = paths[0]
+
+        return filename, action, original
+
+    def parse_numstat(self, line):
+        added, removed, path = line.split("\t", 2)
+
+        # binary files are reported as "-"
+        return {
+            "insertions": int(added) if added.isdigit() else 0,
+            "deletions": int(removed) if removed.isdigit() else 0
+        }
+
+    # raw and numstat lines come in the same order for every commit,
+    # so they are paired by position
+    def parse_log(self, lines):
+        entry = None
+
+        for line in lines:
+            line = line.rstrip("\n")
+
+            if line.startswith("\x1e"):
+                if entry:
+                    yield entry
+
+                hexsha, name, email, timestamp, summary = line[1:].split("\x1f", 4)
+
+                entry = {
+                    "hexsha": hexsha,
+                    "author": self.decode(name),
+                    "email": self.decode(email),
+                    "timestamp": timestamp,
+                    "summary": self.decode(summary),
+                    "files": [],
+                    "stats": []
+                }
+
+                continue
+
+            if not line or not entry:
+                continue
+
+            if line.startswith(":"):
+                entry["files"].append(self.parse_raw(line))
+            else:
+                entry["stats"].append(self.parse_numstat(line))
+
+        if entry:
+            yield entry
+
+    def stream_log(self, *revisions):
+        cmd = [
+            "git", "-c", "core.quotepath=off", "log",
+            "--first-parent", "-m", "--raw", "--numstat", "-M", "--no-abbrev",
+            "--format=%s" % self.LOG_FORMAT
+        ] + list(revisions)
+
+        proc = subprocess.Popen(cmd,
+            cwd=self.repo.working_dir,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            close_fds=True)
+
+        try:
+            for entry in self.parse_log(proc.stdout):
+                yield entry
+        finally:
+            proc.stdout.close()
+            stderr = proc.stderr.read()
+            proc.stderr.close()
+
+            if proc.wait() > 0:
+                raise ConnectionError(stderr, self.info)
+
+    def count_commits(self, *revisions):
+        return int(self.repo.git.rev_list("--first-parent", "--count", *revisions))
+
+    def parse_entry(self, branch, entry):
+        revision = branch.create_revision(entry["hexsha"])
+        revision.set_author(entry["author"], entry["email"])
+        revision.set_date(self.parse_date(entry["timestamp"], branch.repo.timezone))
+        revision.message = entry["summary"]
+
+        stats = entry["stats"]
+
+        for index, (filename, action, original) in enumerate(entry["files"]):
+            churn = stats[index] if index < len(stats) else None
+
+            revision.add_file(filename, action, original=original, churn=churn)
 
         return revision
 
-    def analyze(self, branch, resume_at=None):
+    def analyze_log(self, branch, resume_at=None):
+        last_revision = resume_at.next if resume_at else None
+
+        self.switch_to(branch)
+
+        branch.revision_count = self.count_commits("HEAD")
+        branch.save()
+
+        skipping = resume_at is not None
+
+        for entry in self.stream_log("HEAD"):
+            if skipping:
+                if not resume_at.represents(entry["hexsha"]):
+                    continue
+
+                # this revision is being recreated. so it has to go!
+                resume_at.delete()
+                skipping = False
+
+            revision = self.parse_entry(branch, entry)
+            branch.add_revision(revision, last_revision)
+
+            last_revision = revision
+
+    def is_ancestor(self, identifier):
+        try:
+            self.repo.git.merge_base("--is-ancestor", identifier, "HEAD")
+        except git.GitCommandError:
+            return False
+
+        return True
+
+    def analyze_since(self, branch, since):
+        self.switch_to(branch)
+
+        if not self.is_ancestor(since.identifier):
+            raise ConnectionError("%s is not part of the branch history anymore" % since.identifier, self.info)
+
+        revisions = ["HEAD", "^%s" % since.identifier]
+
+        branch.revision_count = branch.revisions.count() + self.count_commits(*revisions)
+        branch.save()
+
+        # new revisions are appended to the existing chain, oldest first
+        last_revision = since
+
+        if GIT_STREAM_LOG:
+            for entry in self.stream_log("--reverse", *revisions):
+                revision = self.parse_entry(branch, entry)
+
+                branch.add_revision(revision)
+                branch.link_revision(last_revision, revision)
+
+                last_revision = revision
+
+            return
+
+        commits = list(self.repo.iter_commits("%s..HEAD" % since.identifier, first_parent=True))
+
+        for commit in reversed(commits):
+            revision = self.parse(branch, commit.parents[0], commit)
+
+            branch.add_revision(revision)
+            branch.link_revision(last_revision, revision)
+
+            last_revision = revision
+
+    def analyze(self, branch, resume_at=None, since=None):
+        if since:
+            return self.analyze_since(branch, since)
+
+        if GIT_STREAM_LOG:
+            return self.analyze_log(branch, resume_at)
+
         last_commit = None
         last_revision = resume_at.next if resume_at else None
 
@@ -333,8 +732,7 @@ class Git(Connector):
             revision = self.parse(branch, commit, last_commit)
 
             if revision:
-                revision.next = last_revision
-                revision.save()
+                branch.add_revision(revision, last_revision)
 
                 last_revision = revision
 
@@ -345,8 +743,7 @@ class Git(Connector):
         revision = self.parse(branch, None, last_commit)
 
         if revision:
-            revision.next = last_revision
-            revision.save()
+            branch.add_revision(revision, last_revision)
 
     def get_branches(self):
         result = []
@@ -362,19 +759,170 @@ Connector.register("git", Git)
 
 class SVN(Connector):
 
+    # SVN_ERR_FS_NOT_FOUND, e.g. a branch which does not exist yet
+    PATH_NOT_FOUND = 160013
+
     def is_checked_out(self):
         return os.path.exists(self.get_repo_path())
 
+    def get_mirror_path(self):
+        return "%s_mirror" % self.get_repo_path()
+
+    def get_auth_path(self):
+        return "%s_auth" % self.get_repo_path()
+
+    def get_source_root(self):
+        if not hasattr(self, "source_root"):
+            self.source_root = self.repo.root_url_from_path(self.info.url)
+
+        return self.source_root
+
+    def get_root(self):
+        if SVN_MIRROR:
+            return "file://%s" % self.get_mirror_path()
+
+        return self.get_source_root()
+
+    # in mirror mode everything is read from the local svnsync mirror
+    def get_url(self):
+        if not SVN_MIRROR:
+            return self.info.url
+
+        return "%s%s" % (self.get_root(), self.info.url[len(self.get_source_root()):])
+
+    def execute(self, cmd):
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, close_fds=True)
+
+        stdout, stderr = proc.communicate()
+
+        if not proc.returncode == 0:
+            raise ConnectionError(stderr, self.info)
+
+        return stdout
+
+    # svnsync reads the credentials from a private auth cache. As arguments
+    # they would show up in the process list
+    def cache_credentials(self):
+        path = self.get_auth_path()
+
+        if not os.path.exists(path):
+            os.makedirs(path, 0700)
+
+        os.chmod(path, 0700)
+
+        with open("%s/config" % path, "wb") as f:
+            f.write("[auth]\npassword-stores =\n")
+
+        with open("%s/servers" % path, "wb") as f:
+            f.write("[global]\nstore-passwords = yes\nstore-plaintext-passwords = yes\n")
+
+        client = Client(path)
+        client.exception_style = 1
+        client.set_auth_cache(True)
+        client.set_store_passwords(True)
+        client.callback_get_login = self.get_login(self.info, may_save=True)
+        client.callback_ssl_server_trust_prompt = self.get_trust(self.info)
+
+        # any authenticated request fills the cache
+        client.info2(self.get_source_root(),
+            revision=Revision(revision_kind.head),
+            recurse=False)
+
+    def svnsync(self, *args):
+        cmd = ["svnsync"] + list(args) + ["--non-interactive"]
+
+        if not self.info.anonymous:
+            if not getattr(self, "credentials_cached", False):
+                self.cache_credentials()
+                self.credentials_cached = True
+
+            cmd = cmd + ["--config-dir", self.get_auth_path()]
+
+        return self.execute(cmd)
+
+    # svnsync records the source url as the last step of its initialization
+    def is_mirrored(self):
+        if not os.path.exists(self.get_mirror_path()):
+            return False
+
+        revision, url = self.repo.revpropget("svn:sync-from-url", self.get_root(),
+            revision=Revision(revision_kind.number, 0))
+
+        return bool(url)
+
+    def create_mirror(self):
+        path = self.get_mirror_path()
+
+        self.execute(["svnadmin", "create", path])
+
+        try:
+            self.initialize_mirror(path)
+        except:
+            # a half created mirror could never be synchronized
+            rmtree(path)
+            raise
+
+    def initialize_mirror(self, path):
+        # svnsync stores its bookkeeping in revision properties
+        hook = "%s/hooks/pre-revprop-change" % path
+
+        with open(hook, "wb") as f:
+            f.write("#!/bin/sh\nexit 0\n")
+
+        os.chmod(hook, 0755)
+
+        name, info = self.repo.info2(self.info.url,
+            revision=Revision(revision_kind.head),
+            recurse=False)[0]
+
+        # sharing the uuid allows to relocate existing working copies
+        self.execute(["svnadmin", "setuuid", path, info["repos_UUID"]])
+
+        self.svnsync("initialize", self.get_root(), self.get_source_root())
+
+    def sync(self):
+        if not SVN_MIRROR:
+            return
+
+        if not self.is_mirrored():
+            if os.path.exists(self.get_mirror_path()):
+                # left behind by an interrupted initialization
+                rmtree(self.get_mirror_path())
+
+            self.create_mirror()
+
+        self.svnsync("synchronize", self.get_root())
+
+    def relocate(self):
+        path = self.get_repo_path()
+        root = self.repo.info(path).repos
+
+        if not root == self.get_root():
+            self.repo.relocate(root, self.get_root(), path)
+
     def switch_to(self, branch):
-        path = "%s%s" % (self.info.url, branch.path)
+        self.sync()
+
+        path = "%s%s" % (self.get_url(), branch.path)
 
         if not self.is_checked_out():
             self.repo.checkout(path, self.get_repo_path(), ignore_externals=True)
         else:
+            self.relocate()
             self.repo.switch(self.get_repo_path(), path)
 
+    def attach_worker(self, branch, worker):
+        self.worker = worker
+
+        path = "%s%s" % (self.get_url(), branch.path)
+
+        if not os.path.exists(self.get_work_path()):
+            self.repo.checkout(path, self.get_work_path(), ignore_externals=True)
+        else:
+            self.repo.switch(self.get_work_path(), path)
+
     def checkout(self, revision):
-        self.repo.update(self.get_repo_path(),
+        self.repo.update(self.get_work_path(),
             recurse=True,
             revision=Revision(revision_kind.number, revision.identifier),
             ignore_externals=True)
@@ -382,6 +930,9 @@ class SVN(Connector):
     def create_repo(self, repo):
         client = Client()
 
+        # errors carry the codes of all svn errors that caused them
+        client.exception_style = 1
+
         client.callback_get_login = self.get_login(repo)
         client.callback_ssl_server_trust_prompt = self.get_trust(repo)
 
@@ -393,14 +944,14 @@ class SVN(Connector):
 
         return callback_ssl_trust_prompt
 
-    def get_login(self, repo):
-        def callback_get_login(realm, username, may_save):
-            return not repo.anonymous, repo.user, repo.password, False
+    def get_login(self, repo, may_save=False):
+        def callback_get_login(realm, username, save):
+            return not repo.anonymous, repo.user, repo.password, may_save
 
         return callback_get_login
 
     def get_head_revision(self, branch):
-        head = self.repo.info2("%s%s" % (self.info.url, branch.path),
+        head = self.repo.info2("%s%s" % (self.get_url(), branch.path),
             revision=Revision(revision_kind.head),
             recurse=False)
 
@@ -416,9 +967,8 @@ class SVN(Connector):
 
     def full_path(self, revision, filename):
         branch = revision.branch
-        repo = branch.repo
 
-        return "%s%s/%s" % (repo.url, branch.path, filename)
+        return "%s%s/%s" % (self.get_url(), branch.path, filename)
 
     def parse_churn(self, diff):
         added = 0
@@ -459,35 +1009,221 @@ class SVN(Connector):
 
         return result
 
-    def get_churn(self, revision, f):
-        previous = f.get_previous(faulty=True)
+    # counts the added and removed lines of every file in one pass
+    def split_churn(self, diff):
+        churn = {}
+        current = None
+        header = False
+
+        for line in diff.splitlines():
+            if line.startswith("Index: "):
+                current = {
+                    "added": 0,
+                    "removed": 0
+                }
+
+                churn[line[7:].strip()] = current
+                header = True
+
+                continue
+
+            if not current:
+                continue
+
+            if header:
+                # separator and ---/+++ lines up to the first hunk
+                header = not line.startswith("@@")
 
-        if not previous:
+                continue
+
+            if line.startswith("+"):
+                current["added"] = current["added"] + 1
+
+            if line.startswith("-"):
+                current["removed"] = current["removed"] + 1
+
+        return churn
+
+    def get_revision_churn(self, revision):
+        number = int(revision.identifier)
+
+        try:
+            # the results are stored while the next revision is checked out
+            diff = self.get_client().diff("/tmp",
+                urllib.quote("%s%s" % (self.get_url(), revision.branch.path), ":/"),
+                revision1=Revision(revision_kind.number, number - 1),
+                revision2=Revision(revision_kind.number, number)
+            )
+        except ClientError, e:
+            if not self.is_missing(e):
+                raise
+
+            # the branch did not exist before this revision
+            return {}
+
+        return self.split_churn(diff)
+
+    def lock(self, revision):
+        self.churn = None
+
+    def unlock(self):
+        self.churn = None
+
+    def get_churn(self, revision, f):
+        if f.change_type == Action.ADD:
             return
 
-        diff = self.repo.diff("/tmp",
-            urllib.quote(self.full_path(previous.revision, f.full_path()), ":/"),
-            revision1=Revision(revision_kind.number, previous.revision.identifier),
-            revision2=Revision(revision_kind.number, revision.identifier)
-        )
+        # one diff per revision serves all of its files
+        if getattr(self, "churn", None) is None:
+            self.churn = self.get_revision_churn(revision)
 
-        added, removed = self.parse_churn(diff)
+        filename = f.full_path().lstrip("/")
 
-        return {
-            "added": added,
-            "removed": removed
-        }
+        return self.churn.get(filename)
 
-    def get_log(self, branch, revision):
+    def get_client(self):
+        # pysvn clients must not be shared between threads
+        if not hasattr(self, "local"):
+            self.local = threading.local()
+
+        if not hasattr(self.local, "client"):
+            self.local.client = self.create_repo(self.info)
+
+        return self.local.client
+
+    def is_missing(self, error):
+        if len(error.args) < 2:
+            return False
+
+        return len([code for message, code in error.args[1] if code == self.PATH_NOT_FOUND]) > 0
+
+    def read_log(self, client, branch, start, end, limit=0):
+        return client.log("%s%s" % (self.get_url(), branch.path),
+            revision_start=Revision(revision_kind.number, start),
+            revision_end=Revision(revision_kind.number, end),
+            discover_changed_paths=True,
+            limit=limit)
+
+    def exists(self, client, branch, number):
         try:
-            return self.repo.log("%s%s" % (self.info.url, branch.path),
-                revision_start=Revision(revision_kind.number, revision),
-                revision_end=Revision(revision_kind.number, revision),
-                discover_changed_paths=True,
-                limit=0)
-        except:
+            self.read_log(client, branch, number, number, limit=1)
+        except ClientError, e:
+            if not self.is_missing(e):
+                raise
+
+            return False
+
+        return True
+
+    def get_missing(self, branch):
+        # the branch is known not to exist in any revision up to this one
+        if not hasattr(self, "missing"):
+            self.missing = {}
+
+        return self.missing.get(branch.path, 0)
+
+    def set_missing(self, branch, number):
+        self.missing[branch.path] = max(self.get_missing(branch), number)
+
+    def find_first_revision(self, client, branch, low, high):
+        # bisects for the revision the branch has been created in. it is
+        # expected to exist ever after
+        while low < high:
+            middle = (low + high) / 2
+
+            if self.exists(client, branch, middle):
+                high = middle
+            else:
+                low = middle + 1
+
+        return low
+
+    def get_log(self, branch, start, end=None, client=None):
+        client = client or self.repo
+
+        if end is None:
+            end = start
+
+        low, high = min(start, end), max(start, end)
+
+        if high <= self.get_missing(branch):
             return []
 
+        try:
+            return self.read_log(client, branch, start, end)
+        except ClientError, e:
+            if not self.is_missing(e):
+                raise
+
+        if start == end:
+            # the branch does not exist in this revision
+            return []
+
+        if not self.exists(client, branch, high):
+            # the branch is created after this window, so are all
+            # windows before it
+            self.set_missing(branch, high)
+
+            return []
+
+        first = self.find_first_revision(client, branch, low, high)
+
+        self.set_missing(branch, first - 1)
+
+        if start > end:
+            start, end = high, first
+        else:
+            start, end = first, high
+
+        try:
+            return self.read_log(client, branch, start, end)
+        except ClientError, e:
+            if not self.is_missing(e):
+                raise
+
+        # the branch has been deleted and created again in between, only
+        # the revisions without it are left out
+        step = -1 if start > end else 1
+        entries = []
+
+        for number in range(start, end + step, step):
+            entries.extend(self.get_log(branch, number, client=client))
+
+        return entries
+
+    def get_windows(self, start, end):
+        step = max(1, SVN_LOG_WINDOW)
+
+        if start >= end:
+            return [(high, max(end, high - step + 1)) for high in range(start, end - 1, -step)]
+
+        return [(low, min(end, low + step - 1)) for low in range(start, end + 1, step)]
+
+    # fetched in windows of SVN_LOG_WINDOW revisions, oldest first
+    def iter_log(self, branch, start, end):
+        windows = self.get_windows(start, end)
+
+        if SVN_LOG_THREADS <= 1:
+            for low, high in windows:
+                for entry in self.get_log(branch, low, high):
+                    yield entry
+
+            return
+
+        def fetch(window):
+            return self.get_log(branch, window[0], window[1], client=self.get_client())
+
+        pool = ThreadPool(SVN_LOG_THREADS)
+
+        try:
+            # only as many windows as there are threads are kept in memory
+            for index in range(0, len(windows), SVN_LOG_THREADS):
+                for log in pool.map(fetch, windows[index:index + SVN_LOG_THREADS]):
+                    for entry in log:
+                        yield entry
+        finally:
+            pool.terminate()
+
     def parse(self, branch, identifier):
         log = self.get_log(branch, identifier)
 
@@ -495,9 +1231,10 @@ class SVN(Connector):
             # Revision does not affect current branch
             return
 
-        log = log[0]
+        return self.parse_entry(branch, log[0])
 
-        revision = branch.create_revision(identifier)
+    def parse_entry(self, branch, log):
+        revision = branch.create_revision("%d" % log.revision.number)
 
         try:
             # Oh those SVN folks... Apparently author is not mandatory...
@@ -522,8 +1259,6 @@ class SVN(Connector):
 
             revision.add_file(path, filename.action, original=original)
 
-        revision.save()
-
         return revision
 
     def get_start_revision(self, resume, head):
@@ -535,7 +1270,34 @@ class SVN(Connector):
 
             return head
 
-    def analyze(self, branch, resume_at=None):
+    def analyze_since(self, branch, since):
+        head = self.get_head_revision(branch)
+        start = int(since.identifier) + 1
+
+        branch.revision_count = branch.revisions.count() + max(0, head - start + 1)
+        branch.save()
+
+        # new revisions are appended to the existing chain, oldest first
+        last_revision = since
+
+        if start > head:
+            return
+
+        for log in self.iter_log(branch, start, head):
+            revision = self.parse_entry(branch, log)
+
+            if revision:
+                branch.add_revision(revision)
+                branch.link_revision(last_revision, revision)
+
+                last_revision = revision
+
+    def analyze(self, branch, resume_at=None, since=None):
+        self.sync()
+
+        if since:
+            return self.analyze_since(branch, since)
+
         head = self.get_head_revision(branch)
 
         branch.revision_count = head
@@ -551,17 +1313,17 @@ class SVN(Connector):
             # this revision is being recreated. so it has to go!
             resume_at.delete()
 
-        while head > 0:
-            revision = self.parse(branch, head)
+        if not head:
+            return
+
+        for log in self.iter_log(branch, head, 1):
+            revision = self.parse_entry(branch, log)
 
             if revision:
-                revision.next = last_revision
-                revision.save()
+                branch.add_revision(revision, last_revision)
 
                 last_revision = revision
 
-            head = head - 1
-
     def get_branches(self):
         branches = []
 
@@ -586,9 +1348,16 @@ class SVN(Connector):
 
         return branches
 
+    def clear(self):
+        super(SVN, self).clear()
+
+        for path in [self.get_mirror_path(), self.get_auth_path()]:
+            if os.path.exists(path):
+                rmtree(path)
+
     def update(self, path):
         if not os.path.exists(path):
-            self.repo.checkout(self.info.url, path,
+            self.repo.checkout(self.get_url(), path,
                 revision=Revision(revision_kind.head),
                 recurse=True,
                 ignore_externals=True)
@@ -663,16 +1432,44 @@ class Mercurial(Connector):
 
             revision.add_file(filename, action, original=original)
 
-        revision.save()
+        return revision
+
+    def pull(self):
+        commands.pull(self.ui, self.repo, str(self.info.url))
 
+        self.repo = hg.repository(self.ui, self.get_repo_path())
 
-    def analyze(self, branch):
+    def analyze(self, branch, resume_at=None, since=None):
         # self.switch_to(branch)
 
-        for id in self.repo:
-            commit = self.repo[id]
+        # changesets are read oldest first so every revision is linked
+        # to its successor as soon as that one has been parsed
+        last_revision = since
+        start = 0
+
+        if since:
+            self.pull()
+        elif resume_at:
+            # resume_at is the oldest revision of the chain here. every
+            # batch is stored with its links, so the chain ends with the
+            # last changeset that has been stored completely
+            last_revision = branch.head_revision()
+
+        if last_revision:
+            start = self.repo[str(last_revision.identifier)].rev() + 1
+
+        branch.revision_count = branch.revisions.count() + max(0, len(self.repo) - start)
+        branch.save()
+
+        for id in range(start, len(self.repo)):
+            revision = self.parse(branch, self.repo[id])
+
+            branch.add_revision(revision)
+
+            if last_revision:
+                branch.link_revision(last_revision, revision)
 
-            self.parse(branch, commit)
+            last_revision = revision
 
 
 Connector.register("mercurial", Mercurial)
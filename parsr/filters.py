@@ -0,0 +1,223 @@
+import os
+import re
+import mimetypes
+
+from analyzr.settings import SOURCE_FILTER_MAX_SIZE, SOURCE_FILTER_LINE_LENGTH
+from analyzr.settings import SOURCE_FILTER_VENDOR_FOLDERS, SOURCE_FILTER_VENDOR_TYPES
+
+
+class SourceFilter(object):
+    """
+    Cheap classification of minified, generated and vendored sources which
+    would only skew the measures and keep the checkers busy. Only the path,
+    the size and the beginning of a file are looked at.
+    """
+
+    VENDOR_FILES = re.compile(r"([.-]min|[.-]pack(ed)?|\.bundle)\.js$", re.IGNORECASE)
+
+    # markers written by code generators, e.g. "Code generated by X. DO NOT EDIT."
+    GENERATED = re.compile(r"@generated\b|\bDO NOT EDIT\b")
+
+    # only the head of a file is read
+    SAMPLE_SIZE = 64 * 1024
+    HEADER_LINES = 20
+
+    def __init__(self, max_size=SOURCE_FILTER_MAX_SIZE, line_length=SOURCE_FILTER_LINE_LENGTH,
+            vendor_folders=SOURCE_FILTER_VENDOR_FOLDERS, vendor_types=SOURCE_FILTER_VENDOR_TYPES):
+        self.max_size = max_size * 1024
+        self.line_length = line_length
+
+        self.vendor_folders = set(folder.lower() for folder in vendor_folders)
+        self.vendor_types = set(vendor_types)
+
+    def vendored(self, path, mimetype):
+        if not mimetype in self.vendor_types:
+            return False
+
+        folders = path.split("/")[:-1]
+
+        if self.vendor_folders.intersection(folder.lower() for folder in folders):
+            return True
+
+        return self.VENDOR_FILES.search(path) is not None
+
+    def minified(self, lines):
+        lines = [line for line in lines if line.strip()]
+
+        if not lines:
+            return False
+
+        return sum(len(line) for line in lines) / len(lines) > self.line_length
+
+    def generated(self, lines):
+        return self.GENERATED.search("\n".join(lines[:self.HEADER_LINES])) is not None
+
+    def classify(self, base_path, path, mimetype):
+        """
+        Returns the reason for skipping the file or None if it should be
+        measured.
+        """
+        if self.vendored(path, mimetype):
+            return "vendored"
+
+        filename = "%s/%s" % (base_path, path.lstrip("/"))
+
+        try:
+            if os.path.getsize(filename) > self.max_size:
+                return "oversized"
+
+            with open(filename, "rb") as f:
+                sample = f.read(self.SAMPLE_SIZE)
+        except (IOError, OSError):
+            # missing files are left to the checkers
+            return None
+
+        lines = sample.splitlines()
+
+        if self.generated(lines):
+            return "generated"
+
+        if self.minified(lines):
+            return "minified"
+
+        return None
+
+
+class PathFilter(object):
+    """
+    Decides which files of a commit are stored at all. The ignore rules of
+    a repository and the languages that can be measured are compiled once,
+    the decision for a folder is remembered for all of its files.
+
+    Rules without wildcards keep their plain meaning: folders match
+    anywhere in the path, files by the beginning of their name. Rules with
+    *, ? or [] are glob patterns where * stays within a folder and **
+    spans folders. File rules containing a slash match the end of the path.
+    """
+
+    WILDCARDS = re.compile(r"[*?[]")
+
+    def __init__(self, folders, files, types):
+        self.languages = self.get_languages(types)
+
+        self.folders = self.compile([self.folder_pattern(rule) for rule in self.split(folders)])
+        self.files = self.compile([self.file_pattern(rule) for rule in self.split(files)])
+
+        self.ignored_folders = {}
+
+    def split(self, rules):
+        if not rules:
+            return []
+
+        return [rule.strip() for rule in rules.split(",") if rule.strip()]
+
+    def compile(self, patterns):
+        if not patterns:
+            return None
+
+        return re.compile("|".join("(?:%s)" % pattern for pattern in patterns))
+
+    def get_languages(self, types):
+        if not mimetypes.inited:
+            mimetypes.init()
+
+        languages = {}
+
+        for extension, mimetype in mimetypes.types_map.iteritems():
+            language = mimetype.split("/")[1]
+
+            if language in types:
+                languages[extension.lower()] = language
+
+        return languages
+
+    def translate(self, glob):
+        pattern = []
+        i = 0
+
+        while i < len(glob):
+            c = glob[i]
+
+            if glob.startswith("**/", i):
+                pattern.append("(?:.*/)?")
+                i = i + 3
+
+                continue
+
+            if glob.startswith("**", i):
+                pattern.append(".*")
+                i = i + 2
+
+                continue
+
+            if c == "*":
+                pattern.append("[^/]*")
+            elif c == "?":
+                pattern.append("[^/]")
+            elif c == "[" and "]" in glob[i + 1:]:
+                end = glob.index("]", i + 1)
+                pattern.append("[%s]" % glob[i + 1:end].replace("!", "^", 1).replace("\\", "\\\\"))
+                i = end
+            else:
+                pattern.append(re.escape(c))
+
+            i = i + 1
+
+        return "".join(pattern)
+
+    def folder_pattern(self, rule):
+        if not self.WILDCARDS.search(rule):
+            return re.escape(rule)
+
+        if not rule.startswith("/"):
+            rule = "/%s" % rule
+
+        if not rule.endswith("/"):
+            rule = "%s/" % rule
+
+        return self.translate(rule)
+
+    def file_pattern(self, rule):
+        if not self.WILDCARDS.search(rule):
+            return "(?:^|/)%s[^/]*$" % re.escape(rule)
+
+        return "(?:^|/)%s$" % self.translate(rule.lstrip("/"))
+
+    def language(self, filename):
+        # unlike guess_type only the last extension counts, so compressed
+        # sources like app.js.gz are not taken for javascript anymore
+        name, extension = os.path.splitext(filename)
+
+        return self.languages.get(extension.lower())
+
+    def ignores_folder(self, package):
+        if not package in self.ignored_folders:
+            path = package
+
+            if not path.startswith("/"):
+                path = "/%s" % path
+
+            if not path.endswith("/"):
+                path = "%s/" % path
+
+            self.ignored_folders[package] = self.folders is not None and self.folders.search(path) is not None
+
+        return self.ignored_folders[package]
+
+    def admit(self, package, filename):
+        """
+        Returns the language of a file that should be stored, None for all
+        other files.
+        """
+        language = self.language(filename)
+
+        if not language:
+            return None
+
+        if self.ignores_folder(package):
+            return None
+
+        if self.files and self.files.search("%s/%s" % (package.rstrip("/"), filename)):
+            return None
+
+        return language
@@ -5,9 +5,10 @@ from dateutil import parser
 from hashlib import md5
 from urllib import urlencode
 from fractions import Fraction
+from decimal import Decimal
 from copy import copy
 
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Count, Sum, Avg, Min, Max, Q
 from django.db.models.signals import post_save, pre_save, pre_delete
 from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
@@ -15,14 +16,16 @@ from django.dispatch import receiver
 
 from timezone_field import TimeZoneField
 
-from mimetypes import guess_type
-
 from parsr.connectors import Connector, Action, ConnectionError
 from parsr.analyzers import Analyzer
 from parsr.classification import Classify
+from parsr.writers import BatchWriter
+from parsr.resolvers import AuthorResolver, PackageResolver
+from parsr.cache import MeasureCache, Quarantine
+from parsr.filters import SourceFilter, PathFilter
 from parsr import sql, utils
 
-from analyzr.settings import TIME_ZONE, CONTRIBUTORS_PER_PAGE, ANONYMIZE
+from analyzr.settings import TIME_ZONE, CONTRIBUTORS_PER_PAGE, ANONYMIZE, MEASURE_WORKERS, MEASURE_CACHE, CHECKER_QUARANTINE, SOURCE_FILTER
 
 
 # in days
@@ -119,22 +122,8 @@ class Repo(models.Model):
 
         return None
 
-    def ignores(self, package, filename):
-        if not package.startswith("/"):
-            package = "/%s" % package
-
-        if not package.endswith("/"):
-            package = "%s/" % package
-
-        for pkg in self.ignored_folders.split(","):
-            if pkg and pkg in package:
-                return True
-
-        for name in self.ignored_files.split(","):
-            if name and filename.startswith(name):
-                return True
-
-        return False
+    def create_path_filter(self):
+        return PathFilter(self.ignored_folders, self.ignored_files, Analyzer.parseable_types())
 
     def is_checked_out(self):
         connector = Connector.get(self)
@@ -239,6 +228,12 @@ class Branch(models.Model):
     last_analyze_error = models.TextField(null=True, blank=True)
     last_measure_error = models.TextField(null=True, blank=True)
 
+    # buffers revisions and files while the branch is being analyzed
+    writer = None
+
+    # decides which files are stored while the branch is being analyzed
+    path_filter = None
+
     def __unicode__(self):
         return "%s at %s" % (self.name, self.path)
 
@@ -331,10 +326,17 @@ class Branch(models.Model):
 
         sql.execute(query)
 
-    def analyze(self, resume=False):
+    def analyze(self, resume=False, incremental=False):
         if system_busy():
             return
 
+        head = None
+
+        if incremental:
+            # only commits newer than the current head are ingested. without
+            # a head there is nothing to build upon
+            head = self.head_revision()
+
         self.last_analyze_error = None
 
         self.analyzed = False
@@ -344,7 +346,7 @@ class Branch(models.Model):
         self.measuring = False
         self.save()
 
-        if not resume:
+        if not resume and not head:
             self.cleanup()
 
         revision = None
@@ -354,16 +356,115 @@ class Branch(models.Model):
         if resume:
             revision = self.last_analyzed_revision()
 
+        packages = PackageResolver(Package, self)
+
+        self.writer = BatchWriter(self, AuthorResolver(Author), packages)
+        self.path_filter = self.repo.create_path_filter()
+
         connector = Connector.get(self.repo)
-        connector.analyze(self, revision)
+        connector.analyze(self, revision, since=head)
+
+        self.writer.finish()
+        self.writer = None
+        self.path_filter = None
+
+        self.link_files(since=head)
 
-        self.init_packages()
+        if not head:
+            self.init_packages()
+        elif packages.created:
+            self.extend_packages()
 
         self.analyzing = False
         self.analyzed = True
         self.analyzed_date = datetime.now(self.repo.timezone)
         self.save()
 
+    def revision_chain(self, since=None):
+        """
+        Returns the ids of the revisions in history order by following their
+        next pointers. Revisions that are not linked are ordered by date.
+        """
+        revisions = list(self.revisions.values_list("id", "next_id", "date").order_by("date", "id"))
+        links = dict((pk, next_id) for pk, next_id, date in revisions)
+
+        if since:
+            starts = [links.get(since.id)]
+        else:
+            targets = set(links.itervalues())
+            starts = [pk for pk, next_id, date in revisions if not pk in targets]
+
+        chain = []
+        seen = set()
+
+        for pk in starts:
+            while pk and not pk in seen:
+                seen.add(pk)
+                chain.append(pk)
+
+                pk = links.get(pk)
+
+        return chain
+
+    def link_files(self, since=None, chunk_size=500):
+        """
+        Points every file to the version of the same path in the preceding
+        revision and numbers the versions of every path. Only the revisions
+        following `since` are linked if it is given.
+        """
+        revisions = self.revision_chain(since)
+        latest = {}
+
+        for i in range(0, len(revisions), chunk_size):
+            chunk = revisions[i:i + chunk_size]
+            order = dict((pk, index) for index, pk in enumerate(chunk))
+
+            files = File.objects\
+                .filter(revision__in=chunk)\
+                .values_list("id", "revision_id", "pkg_id", "name")
+
+            files = sorted(files, key=lambda f: (order[f[1]], f[0]))
+
+            if since:
+                self.load_latest_versions(latest, files, chunk_size)
+
+            rows = []
+
+            for pk, revision, pkg, name in files:
+                previous, sequence = latest.get((pkg, name), (None, 0))
+
+                rows.append((pk, (previous, sequence + 1)))
+
+                latest[(pkg, name)] = (pk, sequence + 1)
+
+            with transaction.atomic():
+                sql.bulk_update(File, ["previous_version_id", "sequence"], rows)
+
+    def link_unlinked_files(self):
+        # branches ingested before versions were linked are linked once
+        # along the revision chain before they are measured
+        if File.objects.filter(revision__branch=self, sequence=0).exists():
+            self.link_files()
+
+    def load_latest_versions(self, latest, files, chunk_size=500):
+        keys = set((pkg, name) for pk, revision, pkg, name in files) - set(latest.iterkeys())
+
+        if not keys:
+            return
+
+        names = list(set(name for pkg, name in keys))
+        packages = list(set(pkg for pkg, name in keys))
+
+        for i in range(0, len(names), chunk_size):
+            versions = File.objects\
+                .filter(name__in=names[i:i + chunk_size], pkg__in=packages, sequence__gt=0)\
+                .values_list("id", "pkg_id", "name", "sequence")\
+                .order_by("sequence")
+
+            for pk, pkg, name, sequence in versions:
+                if (pkg, name) in keys:
+                    latest[(pkg, name)] = (pk, sequence)
+
     def abort_analyze(self, error):
         self.analyzed = False
         self.analyzing = False
@@ -379,43 +480,246 @@ class Branch(models.Model):
         root = Package.root(self)
         root.update()
 
+    def extend_packages(self):
+        """
+        Computes the nested set of the package tree in memory, just like
+        Package.update does, and only writes the packages that moved.
+        """
+        root = None
+        children = {}
+
+        for package in Package.objects.filter(branch=self).order_by("id"):
+            if not package.parent_id:
+                root = package
+
+                continue
+
+            if not package.parent_id in children:
+                children[package.parent_id] = []
+
+            children[package.parent_id].append(package)
+
+        if not root:
+            return
+
+        changes = []
+
+        def update(package, position):
+            left = position
+
+            for child in children.get(package.id, []):
+                position = update(child, position + 1)
+
+            right = position + 1
+
+            if not package.left == left or not package.right == right:
+                changes.append((package.id, (left, right)))
+
+            return right
+
+        update(root, 0)
+
+        sql.bulk_update(Package, ["left", "right"], changes)
+
     def last_analyzed_revision(self):
         return self.revisions.get(previous=None)
 
-    def last_measured_revision(self):
-        revisions = self.revisions.filter(measured=True).order_by("-date")
+    def head_revision(self):
+        revisions = self.revisions.filter(next=None).order_by("-date")[0:1]
 
-        if revisions.count() == 0:
+        if not revisions:
+            return None
+
+        return revisions[0]
+
+    def first_unmeasured_revision(self):
+        # the first revision in the chain that has not been measured yet
+        # either has no predecessor or a measured one
+        revisions = self.revisions\
+                        .filter(measured=False)\
+                        .exclude(previous__measured=False)\
+                        .order_by("date")[0:1]
+
+        if not revisions:
             return None
 
         return revisions[0]
 
-    def measure(self, resume=False):
+    def measure(self, resume=False, incremental=False):
         if system_busy():
             return
 
+        revision = None
+
+        if incremental:
+            revision = self.first_unmeasured_revision()
+
+            if not revision:
+                return
+
         self.last_measure_error = None
 
         self.measured = False
         self.measuring = True
         self.save()
 
-        if not resume:
+        if not resume and not incremental:
             sql.reset(self)
 
-        revision = None
+        # resuming simply continues with all revisions that are not flagged
+        # as measured yet, see plan_measure
 
-        if resume:
-            revision = self.last_measured_revision()
+        self.link_unlinked_files()
+
+        analyzer = self.create_analyzer()
 
-        analyzer = Analyzer(self.repo, self)
-        analyzer.start(revision)
+        if MEASURE_WORKERS > 1:
+            analyzer.start_parallel(revision)
+        else:
+            analyzer.start(revision)
 
         self.measuring = False
         self.measured = True
         self.measured_date = datetime.now(self.repo.timezone)
         self.save()
 
+    def plan_measure(self, revision=None):
+        """
+        Flags the revisions without any measurable file as measured in a
+        single query and returns the ids of the remaining unmeasured
+        revisions in history order, starting at the given revision.
+        """
+        measurable = File.objects\
+            .filter(
+                revision__branch=self,
+                change_type__in=Action.readable(),
+                mimetype__in=Analyzer.parseable_types()
+            )\
+            .values("revision_id")
+
+        sql.skip_revisions(self, measurable.query.sql_with_params())
+
+        chain = self.revision_chain()
+
+        if revision and revision.id in chain:
+            chain = chain[chain.index(revision.id):]
+
+        pending = set(self.revisions.filter(measured=False).values_list("id", flat=True))
+
+        return [pk for pk in chain if pk in pending]
+
+    def create_analyzer(self, worker=None):
+        cache = MeasureCache(CachedMeasures) if MEASURE_CACHE else None
+        quarantine = Quarantine(QuarantinedContent) if CHECKER_QUARANTINE else None
+        source_filter = SourceFilter() if SOURCE_FILTER else None
+
+        return Analyzer(self.repo, self, worker=worker, cache=cache, quarantine=quarantine, source_filter=source_filter)
+
+    def compute_deltas(self, files, chunk_size=500):
+        files = sorted(files)
+
+        for i in range(0, len(files), chunk_size):
+            chunk = File.objects.filter(id__in=files[i:i + chunk_size]).order_by("date")
+
+            for f in chunk:
+                f.add_deltas()
+
+    def recompute_deltas(self, chunk_size=1000):
+        """
+        Rewrites the deltas of all measured files of the branch from the
+        stored measures in one pass, without measuring anything again.
+        """
+        if system_busy():
+            return
+
+        self.measuring = True
+        self.save()
+
+        try:
+            self.rewrite_deltas(chunk_size)
+        finally:
+            self.measuring = False
+            self.save()
+
+    def rewrite_deltas(self, chunk_size=1000):
+        if sql.supports_window_functions():
+            versions = self.lagged_versions()
+        else:
+            versions = self.sorted_versions()
+
+        fields = ["%s_delta" % field for field in File.MEASURES] + ["change_type"]
+        rows = []
+
+        for pk, change_type, values, previous in versions:
+            # added files never have a predecessor, see File.get_previous
+            if change_type == Action.ADD:
+                previous = None
+
+            if previous:
+                deltas = [value - before for value, before in zip(values, previous)]
+            else:
+                deltas = [0] * len(values)
+
+            # same as File.set_deltas
+            if not previous and change_type == Action.MODIFY:
+                change_type = Action.ADD
+
+            rows.append((pk, tuple(deltas) + (change_type,)))
+
+            if len(rows) >= chunk_size:
+                sql.bulk_update(File, fields, rows)
+                rows = []
+
+        sql.bulk_update(File, fields, rows)
+
+    def lagged_versions(self):
+        count = len(File.MEASURES)
+        cursor = sql.previous_measures(self, File.MEASURES, Action.readable())
+
+        while True:
+            rows = cursor.fetchmany(1000)
+
+            if not rows:
+                break
+
+            for row in rows:
+                values = [Decimal("%s" % value) for value in row[2:2 + count]]
+                previous = None
+
+                if row[2 + count] is not None:
+                    previous = [Decimal("%s" % value) for value in row[3 + count:]]
+
+                yield row[0], row[1], values, previous
+
+    def sorted_versions(self):
+        files = File.objects\
+            .filter(revision__branch=self, faulty=False, filtered__isnull=True)\
+            .order_by("pkg", "name", "sequence", "date", "id")\
+            .values_list("id", "change_type", "revision__measured", "pkg_id", "name", *File.MEASURES)
+
+        key = None
+        previous = None
+
+        for f in files.iterator():
+            values = [Decimal("%s" % value) for value in f[5:]]
+
+            if not key == f[3:5]:
+                key = f[3:5]
+                previous = None
+
+            if f[2] and f[1] in Action.readable():
+                yield f[0], f[1], values, previous
+
+            previous = values
+
+    def abort_recompute_deltas(self, error):
+        # the measures are still intact, only the deltas might be stale
+        self.measuring = False
+
+        self.last_measure_error = error
+
+        self.save()
+
     def abort_measure(self, error):
         self.measured = False
         self.measuring = False
@@ -758,6 +1062,7 @@ class Branch(models.Model):
         filters = {
             "revision__branch": self,
             "faulty": False,
+            "filtered__isnull": True,
             "change_type__in": ['"%s"' % action for action in actions] if escaped else actions
         }
 
@@ -780,11 +1085,32 @@ class Branch(models.Model):
         return File.objects.filter(**filters).distinct().order_by("date")
 
     def create_revision(self, identifier):
+        if self.writer:
+            return Revision(branch=self, identifier=identifier)
+
         return Revision.objects.create(
             branch=self,
             identifier=identifier
         )
 
+    def add_revision(self, revision, next=None):
+        if self.writer:
+            self.writer.add(revision, next)
+
+            return
+
+        revision.next = next
+        revision.save()
+
+    def link_revision(self, revision, next):
+        if self.writer:
+            self.writer.link(revision, next)
+
+            return
+
+        revision.next = next
+        revision.save()
+
     def get_languages(self):
         languages = File.objects\
             .filter(revision__branch=self, mimetype__in=Analyzer.parseable_types())\
@@ -1220,17 +1546,15 @@ class Revision(models.Model):
             }
         }
 
-    def add_file(self, filename, action, original=None):
+    def add_file(self, filename, action, original=None, churn=None):
         package, filename = File.parse_name(filename)
 
-        if self.branch.repo.ignores(package, filename):
-            return
+        path_filter = self.branch.path_filter or self.branch.repo.create_path_filter()
 
-        mimetype, encoding = guess_type(filename)
-        mimetype = mimetype.split("/")[1] if mimetype else None
+        # reject ignored files and all files that wouldn't be measurable anyways.
+        mimetype = path_filter.admit(package, filename)
 
-        # reject all files that wouldn't be measurable anyways.
-        if not mimetype in Analyzer.parseable_types():
+        if not mimetype:
             return
 
         if original:
@@ -1238,9 +1562,12 @@ class Revision(models.Model):
                            .filter(name=filename, package=package, revision__branch=self.branch)\
                            .order_by("-date")[0:1]
 
-        pkg = Package.get(package, self.branch)
+        if self.branch.writer:
+            pkg = self.branch.writer.packages.get(package)
+        else:
+            pkg = Package.get(package, self.branch)
 
-        File.objects.create(
+        f = File(
             revision=self,
             author=self.author,
             date=self.date,
@@ -1252,7 +1579,21 @@ class Revision(models.Model):
             copy_of=original[0] if original else None
         )
 
+        if churn:
+            f.lines_added = churn["insertions"]
+            f.lines_removed = churn["deletions"]
+
+        if self.branch.writer:
+            self.branch.writer.add_file(f)
+        else:
+            f.save()
+
     def set_author(self, name, email=None):
+        if self.branch.writer:
+            self.author = self.branch.writer.authors.get(name, email)
+
+            return
+
         author, created = Author.objects.get_or_create(
             name=name,
             email=email
@@ -1331,6 +1672,82 @@ class Revision(models.Model):
                                      package__endswith=package,
                                      change_type__in=Action.readable())[0]
 
+    def get_files(self, filenames):
+        """
+        Resolves many filenames the same way get_file does, using a single
+        query for all readable files of the revision.
+        """
+        names = {}
+
+        for f in self.files.filter(change_type__in=Action.readable()).order_by("id"):
+            names.setdefault(f.name, []).append(f)
+
+        files = {}
+
+        for filename in filenames:
+            package, name = File.parse_name(filename)
+
+            candidates = [f for f in names.get(name, []) if f.package.endswith(package)]
+
+            if not candidates:
+                message = "Could not find file using package: %s and filename: %s." % (
+                    package,
+                    name
+                )
+
+                raise Exception(message)
+
+            files[filename] = candidates[0]
+
+        return files
+
+    def get_previous_files(self, files, chunk_size=500):
+        """
+        Finds the latest sound version before this revision for all given
+        files at once. Returns a dict keyed by the ids of the given files.
+        """
+        previous = {}
+        pending = {}
+
+        files = [f for f in files if not f.change_type == Action.ADD]
+
+        for f in files:
+            if f.previous_version_id:
+                pending.setdefault(f.previous_version_id, []).append(f)
+
+        # follow the version pointers and skip excluded versions on the way
+        while pending:
+            ids = pending.keys()
+            versions = {}
+
+            for i in range(0, len(ids), chunk_size):
+                for version in File.objects.filter(id__in=ids[i:i + chunk_size]):
+                    versions[version.id] = version
+
+            waiting = {}
+
+            for pk, origins in pending.iteritems():
+                version = versions.get(pk)
+
+                if version and version.excluded() and version.previous_version_id:
+                    waiting.setdefault(version.previous_version_id, []).extend(origins)
+
+                    continue
+
+                for f in origins:
+                    previous[f.id] = version if version and not version.excluded() else None
+
+            pending = waiting
+
+        return previous
+
+    def store_files(self, files):
+        # several filenames might have been resolved to the same file
+        files = dict((f.id, f) for f in files)
+        rows = [(pk, f.measure_values()) for pk, f in files.iteritems()]
+
+        sql.bulk_update(File, File.MEASURE_FIELDS, rows)
+
     def stats(self):
         return File.objects.filter(revision=self).aggregate(
             cyclomatic_complexity=Avg("cyclomatic_complexity"),
@@ -1469,11 +1886,19 @@ class File(models.Model):
 
     faulty = models.BooleanField(default=False)
 
+    # reason for skipping minified, generated or vendored sources
+    filtered = models.CharField(max_length=16, null=True, blank=True)
+
     mimetype = models.CharField(max_length=255, null=True)
 
     change_type = models.CharField(max_length=1, null=True, choices=CHANGE_TYPES)
     copy_of = models.ForeignKey("File", null=True)
 
+    # version of the same path in the preceding revision that touched it
+    # and its position in the history of the path (starting at 1)
+    previous_version = models.ForeignKey("File", null=True, related_name="next_versions")
+    sequence = models.IntegerField(default=0)
+
     cyclomatic_complexity = models.DecimalField(max_digits=15, decimal_places=2, default=0)
     cyclomatic_complexity_delta = models.DecimalField(max_digits=15, decimal_places=2, default=0)
 
@@ -1573,13 +1998,50 @@ class File(models.Model):
         if self.change_type == Action.ADD:
             return None
 
+        if self.sequence:
+            previous = self.previous_version
+
+            while previous and (not previous.faulty == faulty or previous.filtered):
+                previous = previous.previous_version
+
+            return previous
+
         return utils.previous(File, self, {
             "name": self.name,
             "faulty": faulty,
+            "filtered__isnull": True,
             "pkg": self.pkg
         })
 
-    def add_measures(self, measures):
+    def excluded(self):
+        # failed and filtered files are left out of all statistics
+        return self.faulty or bool(self.filtered)
+
+    # the measures that have a delta
+    MEASURES = [
+        "cyclomatic_complexity",
+        "halstead_volume",
+        "halstead_difficulty",
+        "fan_in",
+        "fan_out",
+        "sloc",
+        "sloc_squale"
+    ]
+
+    # everything that is written when the results of a revision are stored
+    MEASURE_FIELDS = [
+        "cyclomatic_complexity", "cyclomatic_complexity_delta",
+        "halstead_volume", "halstead_volume_delta",
+        "halstead_difficulty", "halstead_difficulty_delta",
+        "fan_in", "fan_in_delta",
+        "fan_out", "fan_out_delta",
+        "sloc", "sloc_delta",
+        "sloc_squale", "sloc_squale_delta",
+        "lines_added", "lines_removed",
+        "change_type"
+    ]
+
+    def set_measures(self, measures):
         self.cyclomatic_complexity = measures["cyclomatic_complexity"]
 
         self.halstead_volume = measures["halstead_volume"]
@@ -1590,8 +2052,17 @@ class File(models.Model):
         self.sloc = measures["sloc_absolute"]
         self.sloc_squale = measures["sloc"]
 
-        previous = self.get_previous()
+    def add_measures(self, measures, deltas=True):
+        self.set_measures(measures)
 
+        if not deltas:
+            self.save()
+
+            return
+
+        self.add_deltas()
+
+    def set_deltas(self, previous):
         if previous:
             self.cyclomatic_complexity_delta = self.cyclomatic_complexity - previous.cyclomatic_complexity
 
@@ -1609,16 +2080,28 @@ class File(models.Model):
         if not previous and self.change_type == Action.MODIFY:
             self.change_type = Action.ADD
 
+    def add_deltas(self):
+        self.set_deltas(self.get_previous())
         self.save()
 
-    def add_churn(self, churn=None):
+    def has_churn(self):
+        return bool(self.lines_added or self.lines_removed)
+
+    def set_churn(self, churn=None):
         if not churn:
-            return
+            return False
 
         self.lines_added = churn["added"]
         self.lines_removed = churn["removed"]
 
-        self.save()
+        return True
+
+    def add_churn(self, churn=None):
+        if self.set_churn(churn):
+            self.save()
+
+    def measure_values(self):
+        return tuple(getattr(self, field) for field in File.MEASURE_FIELDS)
 
     def get_identifier(self):
         return md5(self.name).hexdigest()
@@ -1627,6 +2110,33 @@ class File(models.Model):
         return "%s/%s" % (self.package, self.name)
 
 
+class CachedMeasures(models.Model):
+    content_hash = models.CharField(max_length=40)
+    checker = models.CharField(max_length=255)
+    version = models.CharField(max_length=255)
+
+    measures = models.TextField()
+
+    class Meta:
+        unique_together = (("content_hash", "checker", "version"),)
+
+    def __unicode__(self):
+        return "%s measured by %s (%s)" % (self.content_hash, self.checker, self.version)
+
+
+class QuarantinedContent(models.Model):
+    content_hash = models.CharField(max_length=40)
+    checker = models.CharField(max_length=255)
+
+    date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = (("content_hash", "checker"),)
+
+    def __unicode__(self):
+        return "%s quarantined for %s" % (self.content_hash, self.checker)
+
+
 class Author(models.Model):
 
     @classmethod
@@ -0,0 +1,188 @@
+from django.db.models import Max
+
+from parsr import sql, utils
+
+
+class AuthorResolver(object):
+    """
+    Identity map for the authors of a single analysis run. Existing authors
+    are loaded once, new ones are created in bulk with their fake names
+    already assigned.
+    """
+
+    def __init__(self, cls):
+        self.cls = cls
+        self.names = utils.get_names()
+
+        self.authors = {}
+        self.pending = []
+
+        for author in cls.objects.all().order_by("-id"):
+            # get_or_create might have left duplicates behind. the oldest
+            # one would have been returned so it wins
+            self.authors[(author.name, author.email)] = author
+
+        self.next_id = self.last_id() + 1
+
+    def last_id(self):
+        return self.cls.objects.aggregate(last=Max("id"))["last"] or 0
+
+    def get(self, name, email=None):
+        if name is None:
+            raise ValueError("Authors need a name")
+
+        key = (name, email)
+
+        if key in self.authors:
+            return self.authors[key]
+
+        # mimics Author.add_fake_name, which picks the name by id
+        author = self.cls(
+            name=name,
+            email=email,
+            fake_name=self.names[self.next_id % len(self.names)]
+        )
+
+        self.next_id = self.next_id + 1
+
+        self.authors[key] = author
+        self.pending.append(author)
+
+        return author
+
+    def flush(self):
+        if not self.pending:
+            return
+
+        last_id = self.last_id()
+
+        self.cls.objects.bulk_create(self.pending)
+
+        created = self.cls.objects\
+                      .filter(id__gt=last_id)\
+                      .order_by("-id")\
+                      .values_list("id", "name", "email")
+
+        # authors created by others in the meantime are told apart by
+        # their name, the oldest one of a name wins again
+        ids = dict(((name, email), pk) for pk, name, email in created)
+
+        renamed = []
+
+        for author in self.pending:
+            author.id = ids[(author.name, author.email)]
+
+            # the predicted id is off if ids were skipped or taken
+            fake_name = self.names[author.id % len(self.names)]
+
+            if not author.fake_name == fake_name:
+                author.fake_name = fake_name
+                renamed.append((author.id, (fake_name,)))
+
+        sql.bulk_update(self.cls, ["fake_name"], renamed)
+
+        self.next_id = self.last_id() + 1
+        self.pending = []
+
+
+class PackageResolver(object):
+    """
+    Package tree of a branch kept as a trie for a single analysis run.
+    Resolving a path costs one dictionary lookup per path segment and
+    missing packages are inserted in bulk, level by level.
+    """
+
+    def __init__(self, cls, branch):
+        self.cls = cls
+        self.branch = branch
+
+        self.pending = []
+        self.created = 0
+
+        packages = {}
+
+        for package in cls.objects.filter(branch=branch):
+            packages[package.id] = {
+                "package": package,
+                "children": {}
+            }
+
+        self.root = None
+
+        for pk, node in packages.iteritems():
+            package = node["package"]
+
+            if not package.parent_id:
+                self.root = node
+
+                continue
+
+            if package.parent_id in packages:
+                packages[package.parent_id]["children"][package.name] = node
+
+    def get_root(self):
+        # every first analysis starts without any package
+        if not self.root:
+            self.root = self.create("/", None)
+
+        return self.root
+
+    def get(self, name):
+        # package names are built just like Package.get does it
+        node = self.get_root()
+        parent_name = ""
+
+        for pkg in name.split("/"):
+            pkg_name = "%s/%s" % (parent_name, pkg)
+
+            if not pkg_name in node["children"]:
+                node["children"][pkg_name] = self.create(pkg_name, node["package"])
+
+            node = node["children"][pkg_name]
+            parent_name = pkg_name
+
+        return node["package"]
+
+    def create(self, name, parent):
+        package = self.cls(name=name, branch=self.branch, parent=parent)
+
+        self.pending.append(package)
+
+        return {
+            "package": package,
+            "children": {}
+        }
+
+    def flush(self):
+        levels = {}
+
+        for package in self.pending:
+            # the root has to be stored before all other packages
+            depth = package.name.count("/") if package.parent else 0
+
+            if not depth in levels:
+                levels[depth] = []
+
+            levels[depth].append(package)
+
+        # parents have to be stored before their children can point to them
+        for depth in sorted(levels.keys()):
+            packages = levels[depth]
+
+            for package in packages:
+                package.parent_id = package.parent.id if package.parent else None
+
+            last_id = self.cls.objects.aggregate(last=Max("id"))["last"] or 0
+
+            self.cls.objects.bulk_create(packages)
+
+            created = self.cls.objects\
+                          .filter(branch=self.branch, id__gt=last_id)\
+                          .order_by("id")\
+                          .values_list("id", flat=True)
+
+            for package, pk in zip(packages, created):
+                package.id = pk
+
+        self.created = self.created + len(self.pending)
+        self.pending = []
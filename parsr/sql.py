@@ -2,11 +2,14 @@ from django.db import connection, transaction
 
 from analyzr.settings import LAMBDA
 
+# bound variables per statement that sqlite accepts before version 3.32
+SQLITE_MAX_VARIABLES = 999
 
-def execute(query):
+
+def execute(query, params=None):
     cursor = connection.cursor()
 
-    cursor.execute(query)
+    cursor.execute(query, params)
     transaction.commit_unless_managed()
 
     return cursor
@@ -86,6 +89,167 @@ def reset(branch):
     execute(query)
 
 
+def skip_revisions(branch, measurable):
+    """
+    Flags every unmeasured revision of a branch as measured unless it is
+    selected by the measurable query, given as a (sql, params) tuple.
+    """
+    query, params = measurable
+
+    query = """
+        UPDATE
+            parsr_revision
+        SET
+            measured = %%s
+        WHERE
+            branch_id = %%s AND measured = %%s AND id NOT IN ( SELECT * FROM ( %s ) AS TMP )
+    """ % query
+
+    execute(query, [True, branch.id, False] + list(params))
+
+
+def get_chunk_size(fields, chunk_size=500):
+    """
+    Number of rows that can be updated with one CASE statement per field.
+    Every field takes a WHEN clause per row, so sqlite needs smaller
+    chunks the more fields are updated.
+    """
+    if connection.vendor == "sqlite":
+        return max(1, min(chunk_size, SQLITE_MAX_VARIABLES // (2 * fields + 1)))
+
+    return chunk_size
+
+
+def link_revisions(links, chunk_size=None):
+    """
+    Sets next_id for a list of (revision id, next revision id) tuples
+    using one UPDATE per chunk.
+    """
+    chunk_size = chunk_size or get_chunk_size(1)
+
+    for start in range(0, len(links), chunk_size):
+        chunk = links[start:start + chunk_size]
+
+        query = """
+            UPDATE
+                parsr_revision
+            SET
+                next_id = CASE id %(cases)s END
+            WHERE
+                id IN (%(ids)s)
+        """ % {
+            "cases": " ".join(["WHEN %d THEN %d" % link for link in chunk]),
+            "ids": ", ".join(["%d" % revision for revision, next in chunk])
+        }
+
+        execute(query)
+
+
+def bulk_update(cls, fields, rows, chunk_size=None):
+    """
+    Updates several fields of many rows at once. Every row is an
+    (id, values) tuple holding one value per field.
+    """
+    quote = connection.ops.quote_name
+    chunk_size = chunk_size or get_chunk_size(len(fields))
+
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+
+        columns = []
+        params = []
+
+        for index, field in enumerate(fields):
+            cases = []
+
+            for pk, values in chunk:
+                cases.append("WHEN %d THEN %%s" % pk)
+                params.append(values[index])
+
+            columns.append("%s = CASE id %s END" % (quote(field), " ".join(cases)))
+
+        query = """
+            UPDATE
+                %(table)s
+            SET
+                %(columns)s
+            WHERE
+                id IN (%(ids)s)
+        """ % {
+            "table": cls._meta.db_table,
+            "columns": ", ".join(columns),
+            "ids": ", ".join(["%d" % pk for pk, values in chunk])
+        }
+
+        execute(query, params)
+
+
+def supports_concurrent_writes():
+    # sqlite locks the whole database for every write
+    return not connection.vendor == "sqlite"
+
+
+def supports_window_functions():
+    vendor = connection.vendor
+
+    if vendor == "postgresql":
+        return True
+
+    if vendor == "mysql":
+        return connection.mysql_version >= (8, 0)
+
+    if vendor == "sqlite":
+        import sqlite3
+
+        return sqlite3.sqlite_version_info >= (3, 25, 0)
+
+    return False
+
+
+def previous_measures(branch, fields, readable):
+    """
+    Selects the measured files of a branch next to the measures of the
+    preceding sound version of the same path. Every row holds the id, the
+    change type, the measures and the id and measures of the predecessor.
+    """
+    window = "OVER (PARTITION BY F.pkg_id, F.name ORDER BY F.sequence, F.date, F.id)"
+
+    query = """
+        SELECT
+            %(outer)s
+        FROM (
+            SELECT
+                F.id,
+                F.change_type,
+                R.measured,
+                %(fields)s,
+                LAG(F.id) %(window)s AS previous_id,
+                %(previous)s
+            FROM
+                parsr_file AS F
+            INNER JOIN
+                parsr_revision AS R ON R.id = F.revision_id
+            WHERE
+                R.branch_id = %%s AND F.faulty = %%s AND F.filtered IS NULL
+        ) AS A
+        WHERE
+            A.measured = %%s AND A.change_type IN (%(readable)s)
+    """ % {
+        "outer": ", ".join(
+            ["A.id", "A.change_type"] +
+            ["A.%s" % field for field in fields] +
+            ["A.previous_id"] +
+            ["A.previous_%s" % field for field in fields]
+        ),
+        "fields": ", ".join(["F.%s" % field for field in fields]),
+        "previous": ", ".join(["LAG(F.%s) %s AS previous_%s" % (field, window, field) for field in fields]),
+        "window": window,
+        "readable": ", ".join(["%s"] * len(readable))
+    }
+
+    return execute(query, [branch.id, False, True] + list(readable))
+
+
 def squale(fields, group_by, query):
     def convert(field):
         return """
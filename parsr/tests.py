@@ -5,8 +5,38 @@ when you run "manage.py test".
 Replace this with more appropriate tests for your application.
 """
 
+import os
+import git
+import pytz
+import lizard
+import time
+import random
+import shutil
+import tempfile
+import threading
+import subprocess
+
+from mimetypes import guess_type
+
+from decimal import Decimal
+from datetime import datetime
+
+from django.db import connection
 from django.test import TestCase
 
+from parsr import analyzers, checkers, connectors, sql, utils
+from parsr.connectors import Connector, Git, SVN, Mercurial, ConnectionError, Action
+from parsr.models import Repo, Branch, Package, Revision, File, Author
+from parsr.resolvers import PackageResolver, AuthorResolver
+from parsr.writers import BatchWriter
+from parsr.filters import SourceFilter, PathFilter
+from parsr.checkers import Checker, JHawk, ComplexityReport, Lizard, NodeWorker, CheckerException, CheckerTimeout
+from parsr.checkers import XMLSanitizer, SuffixIndex
+
+from pysvn import ClientError
+
+from mercurial import ui, hg
+
 
 class SimpleTest(TestCase):
     def test_basic_addition(self):
@@ -14,3 +44,1573 @@ class SimpleTest(TestCase):
         Tests that 1 + 1 always equals 2.
         """
         self.assertEqual(1 + 1, 2)
+
+
+class PackageResolverTest(TestCase):
+
+    def setUp(self):
+        self.branch = Branch.objects.create(name="master", path="/")
+
+    def test_creates_root_of_empty_branch(self):
+        resolver = PackageResolver(Package, self.branch)
+
+        package = resolver.get("src/main")
+        resolver.flush()
+
+        root = Package.root(self.branch)
+
+        self.assertEqual(root.name, "/")
+        self.assertEqual(package.name, "/src/main")
+        self.assertEqual(package.parent.name, "/src")
+        self.assertEqual(package.parent.parent_id, root.id)
+
+    def test_reuses_created_packages(self):
+        resolver = PackageResolver(Package, self.branch)
+
+        resolver.get("src/main")
+        resolver.get("src/test")
+        resolver.flush()
+
+        resolver = PackageResolver(Package, self.branch)
+        resolver.get("src/main")
+        resolver.flush()
+
+        self.assertEqual(resolver.created, 0)
+        self.assertEqual(Package.objects.filter(branch=self.branch).count(), 4)
+
+    def test_extends_empty_branch(self):
+        self.branch.extend_packages()
+
+        self.assertEqual(Package.objects.filter(branch=self.branch).count(), 0)
+
+
+class BatchWriterTest(TestCase):
+
+    def setUp(self):
+        self.branch = Branch.objects.create(name="master", path="/")
+
+        # ids of other branches must not be mapped to this one
+        other = Branch.objects.create(name="other", path="/other")
+        Revision.objects.create(identifier="r2", branch=other)
+
+        self.packages = PackageResolver(Package, self.branch)
+        self.writer = BatchWriter(self.branch, AuthorResolver(Author), self.packages, size=2)
+
+    def add(self, identifier, next=None):
+        revision = Revision(branch=self.branch, identifier=identifier)
+        revision.date = datetime(2014, 1, 1, tzinfo=pytz.utc)
+
+        pkg = self.packages.get("/src")
+
+        self.writer.add_file(File(revision=revision, date=revision.date, name="%s.js" % identifier,
+            package=pkg.name, pkg=pkg, mimetype="javascript", change_type=Action.MODIFY))
+        self.writer.add(revision, next)
+
+        return revision
+
+    def chain(self):
+        return [Revision.objects.get(pk=pk).identifier for pk in self.branch.revision_chain()]
+
+    def files(self):
+        return sorted((f.revision.identifier, f.name) for f in File.objects.filter(revision__branch=self.branch))
+
+    def test_newest_first(self):
+        # like git and svn, every revision points to the one added before
+        # it, which has been written in an earlier batch in between
+        last = None
+
+        for i in range(5, 0, -1):
+            last = self.add("r%d" % i, last)
+
+        self.writer.finish()
+
+        self.assertEqual(self.chain(), ["r1", "r2", "r3", "r4", "r5"])
+        self.assertEqual(self.files(), [("r%d" % i, "r%d.js" % i) for i in range(1, 6)])
+
+    def test_oldest_first(self):
+        # like mercurial, every revision is linked to its successor once
+        # that one has been added, possibly in the following batch
+        last = None
+
+        for i in range(1, 6):
+            revision = self.add("r%d" % i)
+
+            if last:
+                self.writer.link(last, revision)
+
+            last = revision
+
+        self.writer.finish()
+
+        self.assertEqual(self.chain(), ["r1", "r2", "r3", "r4", "r5"])
+        self.assertEqual(self.files(), [("r%d" % i, "r%d.js" % i) for i in range(1, 6)])
+        self.assertEqual(self.writer.links, [])
+
+
+class AuthorResolverTest(TestCase):
+
+    def setUp(self):
+        self.names = utils.get_names()
+
+    def test_reuses_oldest_author(self):
+        oldest = Author.objects.create(name="Jane", email="jane@example.com")
+        Author.objects.create(name="Jane", email="jane@example.com")
+
+        resolver = AuthorResolver(Author)
+
+        self.assertEqual(resolver.get("Jane", "jane@example.com").id, oldest.id)
+        self.assertEqual(resolver.pending, [])
+
+    def test_maps_ids_of_created_authors(self):
+        Author.objects.create(name="Jane", email="jane@example.com")
+
+        resolver = AuthorResolver(Author)
+
+        first = [resolver.get("Author %d" % i, "%d@example.com" % i) for i in range(3)]
+        resolver.flush()
+
+        second = [resolver.get("Author %d" % i, "%d@example.com" % i) for i in range(2, 5)]
+        resolver.flush()
+
+        self.assertEqual(second[0], first[2])
+
+        for author in first + second:
+            stored = Author.objects.get(pk=author.id)
+
+            self.assertEqual((stored.name, stored.email), (author.name, author.email))
+
+    def test_assigns_fake_names_by_id(self):
+        Author.objects.create(name="Jane", email="jane@example.com")
+
+        resolver = AuthorResolver(Author)
+
+        authors = [resolver.get("Author %d" % i) for i in range(3)]
+        resolver.flush()
+
+        authors.append(resolver.get("Author 3"))
+        resolver.flush()
+
+        for author in authors:
+            stored = Author.objects.get(pk=author.id)
+
+            # the same name Author.add_fake_name would have picked
+            self.assertEqual(stored.fake_name, self.names[stored.id % len(self.names)])
+
+    def test_authors_created_in_the_meantime(self):
+        resolver = AuthorResolver(Author)
+
+        author = resolver.get("Jane", "jane@example.com")
+
+        # takes the id that has been predicted for the pending author
+        other = Author.objects.create(name="John", email="john@example.com")
+
+        resolver.flush()
+
+        stored = Author.objects.get(pk=author.id)
+
+        self.assertNotEqual(author.id, other.id)
+        self.assertEqual(stored.name, "Jane")
+        self.assertEqual(stored.fake_name, self.names[stored.id % len(self.names)])
+        self.assertEqual(author.fake_name, stored.fake_name)
+
+
+class GitPrepareTest(TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.checkouts = tempfile.mkdtemp()
+
+        self.checkout_path = connectors.CHECKOUT_PATH
+        connectors.CHECKOUT_PATH = self.checkouts
+
+        os.makedirs("%s/src" % self.path)
+
+        with open("%s/main.js" % self.path, "w") as f:
+            f.write("var main = 1;\n")
+
+        with open("%s/src/lib.js" % self.path, "w") as f:
+            f.write("var lib = 1;\n")
+
+        self.git("init", "-q")
+        self.git("add", ".")
+        self.git("-c", "user.name=test", "-c", "user.email=test@example.com", "commit", "-q", "-m", "initial")
+
+        self.connector = Git.__new__(Git)
+        self.connector.info = Repo(url=self.path, kind="git")
+        self.connector.worker = None
+        self.connector.slot = None
+        self.connector.blobs = {}
+        self.connector.repo = git.Repo(self.path)
+
+        self.revision = Revision(identifier=self.connector.repo.head.commit.hexsha)
+
+    def tearDown(self):
+        self.connector.close()
+
+        connectors.CHECKOUT_PATH = self.checkout_path
+
+        shutil.rmtree(self.path)
+        shutil.rmtree(self.checkouts)
+
+    def git(self, *args):
+        subprocess.check_call(("git",) + args, cwd=self.path)
+
+    def test_prepares_top_level_files(self):
+        files = [File(package="/", name="main.js"), File(package="/src", name="lib.js")]
+
+        self.connector.prepare(self.revision, files)
+
+        path = self.connector.get_source_path()
+
+        with open("%s/main.js" % path) as f:
+            self.assertEqual(f.read(), "var main = 1;\n")
+
+        self.assertTrue(os.path.isfile("%s/src/lib.js" % path))
+
+        for f in files:
+            # the blob hashes reported by git match the hashes of the written files
+            self.assertEqual(self.connector.get_content_hash(f), Connector.get_content_hash(self.connector, f))
+
+    def test_missing_blob(self):
+        files = [File(package="/", name="missing.js")]
+
+        self.assertRaises(ConnectionError, self.connector.prepare, self.revision, files)
+
+
+class GitLogTest(TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+        self.connector = Git.__new__(Git)
+        self.connector.info = Repo(url=self.path, kind="git")
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def git(self, *args):
+        subprocess.check_call(("git", "-c", "user.name=test", "-c", "user.email=test@example.com") + args, cwd=self.path)
+
+    def write(self, filename, content):
+        with open("%s/%s" % (self.path, filename), "w") as f:
+            f.write(content)
+
+    def test_parse_log(self):
+        lines = [
+            "\x1eabc\x1fJane Doe\x1fjane@example.com\x1f1388534400\x1fSecond\n",
+            "\n",
+            ":100644 100644 1111111 2222222 R087\tsrc/old.js\tsrc/new.js\n",
+            ":100644 100644 3333333 4444444 M\t\"src/tab\\there.js\"\n",
+            ":100644 000000 5555555 0000000 D\tlogo.png\n",
+            "3\t1\tsrc/{old.js => new.js}\n",
+            "2\t0\t\"src/tab\\there.js\"\n",
+            "-\t-\tlogo.png\n",
+            "\x1edef\x1fJane Doe\x1fjane@example.com\x1f1388448000\x1fFirst\n"
+        ]
+
+        entries = list(self.connector.parse_log(lines))
+
+        self.assertEqual([entry["hexsha"] for entry in entries], ["abc", "def"])
+        self.assertEqual(entries[0]["files"], [
+            (u"src/new.js", Action.MOVE, u"src/old.js"),
+            (u"src/tab\there.js", Action.MODIFY, None),
+            (u"logo.png", Action.DELETE, None)
+        ])
+        self.assertEqual(entries[0]["stats"], [
+            {"insertions": 3, "deletions": 1},
+            {"insertions": 2, "deletions": 0},
+            {"insertions": 0, "deletions": 0}
+        ])
+        self.assertEqual(entries[1]["files"], [])
+        self.assertEqual(entries[1]["summary"], u"First")
+
+    def test_stream_log(self):
+        self.git("init", "-q")
+
+        self.write("main.js", "var a = 1;\nvar b = 2;\n")
+        self.git("add", ".")
+        self.git("commit", "-q", "-m", "initial")
+
+        self.write("main.js", "var a = 1;\nvar b = 3;\nvar c = 4;\n")
+        self.git("commit", "-q", "-a", "-m", "modified")
+
+        self.connector.repo = git.Repo(self.path)
+
+        entries = list(self.connector.stream_log("HEAD"))
+
+        # newest first
+        self.assertEqual([entry["summary"] for entry in entries], [u"modified", u"initial"])
+        self.assertEqual(entries[0]["files"], [(u"main.js", Action.MODIFY, None)])
+        self.assertEqual(entries[0]["stats"], [{"insertions": 2, "deletions": 1}])
+        self.assertEqual(entries[1]["files"], [(u"main.js", Action.ADD, None)])
+
+    def test_stream_log_failure(self):
+        self.git("init", "-q")
+
+        self.connector.repo = git.Repo(self.path)
+
+        self.assertRaises(ConnectionError, list, self.connector.stream_log("missing"))
+
+
+class MercurialResumeTest(TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+        self.hg("init")
+
+        for i in range(3):
+            with open("%s/README" % self.path, "w") as f:
+                f.write("%d\n" % i)
+
+            self.hg("commit", "-q", "-A", "-u", "test", "-m", "commit %d" % i)
+
+        # without signals, which would clone the repository
+        Repo.objects.bulk_create([Repo(url=self.path, kind="mercurial")])
+
+        self.repo = Repo.objects.get(url=self.path)
+        self.branch = Branch.objects.create(name="default", path="/", repo=self.repo)
+
+        self.connector = Mercurial.__new__(Mercurial)
+        self.connector.info = self.repo
+        self.connector.ui = ui.ui()
+        self.connector.repo = hg.repository(self.connector.ui, self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def hg(self, *args):
+        subprocess.check_call(("hg",) + args, cwd=self.path)
+
+    def chain(self):
+        return [self.branch.revisions.get(id=pk).identifier for pk in self.branch.revision_chain()]
+
+    def test_resume(self):
+        self.connector.analyze(self.branch)
+
+        complete = self.chain()
+
+        # interrupted after the second changeset
+        self.branch.revisions.filter(identifier=complete[1]).update(next=None)
+        self.branch.revisions.get(identifier=complete[2]).delete()
+
+        self.connector.analyze(self.branch, resume_at=self.branch.last_analyzed_revision())
+
+        self.assertEqual(self.branch.revisions.count(), 3)
+        self.assertEqual(self.chain(), complete)
+
+
+class SVNChurnTest(TestCase):
+
+    def test_split_churn(self):
+        diff = "\n".join([
+            "Index: src/main.js",
+            "===================================================================",
+            "--- src/main.js\t(revision 1)",
+            "+++ src/main.js\t(revision 2)",
+            "@@ -1,3 +1,3 @@",
+            " var a = 1;",
+            "-var b = 2;",
+            "+var b = 3;",
+            "+var c = 4;",
+            "Index: src/lib.js",
+            "===================================================================",
+            "--- src/lib.js\t(revision 1)",
+            "+++ src/lib.js\t(revision 2)",
+            "@@ -1,2 +1,1 @@",
+            "--- a removed line that looks like a header",
+            " var lib = 1;",
+            ""
+        ])
+
+        churn = SVN.__new__(SVN).split_churn(diff)
+
+        self.assertEqual(churn, {
+            "src/main.js": {"added": 2, "removed": 1},
+            "src/lib.js": {"added": 0, "removed": 1}
+        })
+
+    def create_connector(self, code):
+        connector = FakeSVN(None)
+        connector.local = threading.local()
+        connector.local.client = FakeDiffClient(code)
+
+        return connector
+
+    def test_missing_branch(self):
+        connector = self.create_connector(SVN.PATH_NOT_FOUND)
+        revision = Revision(identifier="5", branch=Branch(name="trunk", path="/trunk"))
+
+        self.assertEqual(connector.get_revision_churn(revision), {})
+
+    def test_raises_other_errors(self):
+        connector = self.create_connector(170001)
+        revision = Revision(identifier="5", branch=Branch(name="trunk", path="/trunk"))
+
+        self.assertRaises(ClientError, connector.get_revision_churn, revision)
+
+
+class FakeDiffClient(object):
+
+    def __init__(self, code):
+        self.code = code
+
+    def diff(self, tmp_path, url, revision1, revision2):
+        raise ClientError("diff failed", [("diff failed", self.code)])
+
+
+class FakeSVNClient(object):
+
+    def __init__(self, missing, code=SVN.PATH_NOT_FOUND):
+        self.missing = missing
+        self.code = code
+        self.calls = 0
+
+    def log(self, url, revision_start, revision_end, limit=0, **kwargs):
+        self.calls = self.calls + 1
+
+        start, end = revision_start.number, revision_end.number
+        step = -1 if start > end else 1
+
+        numbers = range(start, end + step, step)
+
+        if self.missing.intersection(numbers):
+            raise ClientError("path not found", [("path not found", self.code)])
+
+        return numbers[:limit] if limit else numbers
+
+
+class FakeSVN(SVN):
+
+    def __init__(self, client):
+        self.repo = client
+
+    def get_url(self):
+        return "file:///repo"
+
+
+class SVNLogTest(TestCase):
+
+    def setUp(self):
+        self.branch = Branch(name="trunk", path="/trunk")
+
+    def test_whole_window(self):
+        connector = FakeSVN(FakeSVNClient(set()))
+
+        self.assertEqual(connector.get_log(self.branch, 5, 1), [5, 4, 3, 2, 1])
+
+    def test_branch_created_late(self):
+        client = FakeSVNClient(set(range(1, 601)))
+        connector = FakeSVN(client)
+
+        entries = []
+
+        for high in range(1000, 0, -100):
+            entries.extend(connector.get_log(self.branch, high, high - 99))
+
+        self.assertEqual(entries, range(1000, 600, -1))
+        # the creation is found by bisecting once, all older windows are
+        # skipped without asking the server
+        self.assertTrue(client.calls < 20)
+
+    def test_ascending_window(self):
+        connector = FakeSVN(FakeSVNClient(set(range(1, 4))))
+
+        self.assertEqual(connector.get_log(self.branch, 1, 6), [4, 5, 6])
+
+    def test_recreated_branch(self):
+        connector = FakeSVN(FakeSVNClient(set([2, 4])))
+
+        self.assertEqual(connector.get_log(self.branch, 5, 1), [5, 3])
+
+    def test_raises_other_errors(self):
+        connector = FakeSVN(FakeSVNClient(set([3]), code=170001))
+
+        self.assertRaises(ClientError, connector.get_log, self.branch, 5, 1)
+
+
+class FakeMirrorClient(object):
+
+    def __init__(self):
+        self.synced_from = None
+
+    def info2(self, url, **kwargs):
+        return [(url, {"repos_UUID": "uuid"})]
+
+    def revpropget(self, name, url, revision):
+        return revision, self.synced_from
+
+
+class FakeMirrorSVN(SVN):
+
+    def __init__(self, path, repo):
+        self.path = path
+        self.info = repo
+        self.repo = FakeMirrorClient()
+        self.source_root = "https://svn.example.com/repo"
+        self.commands = []
+        self.fail = False
+
+    def get_repo_path(self):
+        return self.path
+
+    def cache_credentials(self):
+        pass
+
+    def execute(self, cmd):
+        self.commands.append(cmd)
+
+        if cmd[:2] == ["svnadmin", "create"]:
+            os.makedirs("%s/hooks" % cmd[2])
+
+        if cmd[:2] == ["svnsync", "initialize"]:
+            if self.fail:
+                raise ConnectionError("connection refused", self.info)
+
+            self.repo.synced_from = self.source_root
+
+
+class SVNMirrorTest(TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.repo = Repo(url="https://svn.example.com/repo/trunk", kind="svn",
+            anonymous=False, user="user", password="secret")
+        self.connector = FakeMirrorSVN("%s/repo" % self.path, self.repo)
+
+        self.mirror = connectors.SVN_MIRROR
+        connectors.SVN_MIRROR = True
+
+    def tearDown(self):
+        connectors.SVN_MIRROR = self.mirror
+
+        shutil.rmtree(self.path)
+
+    def test_password_is_not_passed(self):
+        self.connector.sync()
+
+        for cmd in self.connector.commands:
+            self.assertFalse("secret" in cmd)
+
+        self.assertTrue(self.connector.is_mirrored())
+
+    def test_removes_failed_mirror(self):
+        self.connector.fail = True
+
+        self.assertRaises(ConnectionError, self.connector.sync)
+        self.assertFalse(os.path.exists(self.connector.get_mirror_path()))
+
+    def test_recreates_uninitialized_mirror(self):
+        os.makedirs("%s/hooks" % self.connector.get_mirror_path())
+
+        self.connector.sync()
+
+        self.assertEqual([cmd[:2] for cmd in self.connector.commands], [
+            ["svnadmin", "create"],
+            ["svnadmin", "setuuid"],
+            ["svnsync", "initialize"],
+            ["svnsync", "synchronize"]
+        ])
+
+
+class SourceFilterTest(TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.filter = SourceFilter(max_size=16, line_length=200)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def classify(self, name, content):
+        with open("%s/%s" % (self.path, name), "w") as f:
+            f.write(content)
+
+        mimetype = "java" if name.endswith(".java") else "javascript"
+
+        return self.filter.classify(self.path, "/%s" % name, mimetype)
+
+    def test_sources(self):
+        self.assertIsNone(self.classify("Key.java", "/**\n * Wraps the key generated by the database sequence.\n */\nclass Key {}\n"))
+        self.assertIsNone(self.classify("report.js", "// Report is generated from the measures\nvar report = {};\n"))
+        self.assertIsNone(self.classify("edit.js", "// do not edit the returned array\nvar items = [];\n"))
+
+    def test_generated(self):
+        self.assertEqual(self.classify("Parser.java", "// @generated by antlr\nclass Parser {}\n"), "generated")
+        self.assertEqual(self.classify("api.js", "// Code generated by protoc-gen-js. DO NOT EDIT.\nvar api = {};\n"), "generated")
+
+    def test_minified(self):
+        self.assertEqual(self.classify("app.js", "var a=1;" * 100), "minified")
+
+    def test_oversized(self):
+        self.assertEqual(self.classify("data.js", "var a = 1;\n" * 2000), "oversized")
+
+    def test_vendored(self):
+        self.assertEqual(self.filter.classify(self.path, "/static/vendor/jquery.js", "javascript"), "vendored")
+        self.assertEqual(self.filter.classify(self.path, "/static/js/app.min.js", "javascript"), "vendored")
+        self.assertIsNone(self.filter.classify(self.path, "/src/external/client.js", "javascript"))
+
+    def test_vendor_package_of_other_language(self):
+        self.assertIsNone(self.filter.classify(self.path, "/src/com/acme/vendor/Invoice.java", "java"))
+
+    def test_configured_vendor_folders(self):
+        source_filter = SourceFilter(vendor_folders=["lib"], vendor_types=["javascript", "java"])
+
+        self.assertEqual(source_filter.classify(self.path, "/lib/Jar.java", "java"), "vendored")
+        self.assertIsNone(source_filter.classify(self.path, "/static/vendor/jquery.js", "javascript"))
+
+
+def ignores(folders, files, package, filename):
+    # the rules as Repo.ignores applied them before they were compiled
+    if not package.startswith("/"):
+        package = "/%s" % package
+
+    if not package.endswith("/"):
+        package = "%s/" % package
+
+    for pkg in folders.split(","):
+        if pkg and pkg in package:
+            return True
+
+    for name in files.split(","):
+        if name and filename.startswith(name):
+            return True
+
+    return False
+
+
+def admits(folders, files, package, filename):
+    if ignores(folders, files, package, filename):
+        return None
+
+    mimetype, encoding = guess_type(filename)
+    mimetype = mimetype.split("/")[1] if mimetype else None
+
+    if not mimetype in analyzers.Analyzer.parseable_types():
+        return None
+
+    return mimetype
+
+
+class PathFilterTest(TestCase):
+
+    PATHS = [
+        ("/", "main.js"),
+        ("/src", "Main.java"),
+        ("/src/test", "MainTest.java"),
+        ("/src/latest", "news.js"),
+        ("/lib/jquery", "jquery.js"),
+        ("/docs", "README"),
+        ("/static", "style.css"),
+        ("/src/gen", "Parser.java"),
+        ("/src", "Parser.java"),
+        ("src/test/", "Test.java")
+    ]
+
+    def create_filter(self, folders, files):
+        return PathFilter(folders, files, analyzers.Analyzer.parseable_types())
+
+    def test_plain_rules_match_the_old_rules(self):
+        for folders, files in [("", ""), ("test,/lib/", "Parser,Main"), ("/src/gen/", ""), ("", "jquery")]:
+            path_filter = self.create_filter(folders, files)
+
+            for package, filename in self.PATHS:
+                self.assertEqual(path_filter.admit(package, filename), admits(folders, files, package, filename),
+                    "%s/%s with %r and %r" % (package, filename, folders, files))
+
+    def test_folder_globs(self):
+        path_filter = self.create_filter("src/*/generated, **/fixtures", "")
+
+        self.assertIsNone(path_filter.admit("/src/api/generated", "Api.java"))
+        self.assertIsNone(path_filter.admit("/src/api/generated/v1", "Api.java"))
+        self.assertEqual(path_filter.admit("/src/api/v1/generated", "Api.java"), "x-java")
+        self.assertIsNone(path_filter.admit("/test/unit/fixtures", "data.js"))
+        self.assertEqual(path_filter.admit("/test/unit/fixture", "data.js"), "javascript")
+
+    def test_file_globs(self):
+        path_filter = self.create_filter("", "*.min.js, test/**/*Test.java, [Gg]en?.java")
+
+        self.assertIsNone(path_filter.admit("/static", "app.min.js"))
+        self.assertEqual(path_filter.admit("/static", "app.js"), "javascript")
+        self.assertIsNone(path_filter.admit("/test/unit", "MainTest.java"))
+        self.assertIsNone(path_filter.admit("/test", "MainTest.java"))
+        self.assertEqual(path_filter.admit("/src/test", "Main.java"), "x-java")
+        self.assertIsNone(path_filter.admit("/src", "Gen1.java"))
+        self.assertEqual(path_filter.admit("/src", "Gen12.java"), "x-java")
+
+    def test_compressed_sources(self):
+        path_filter = self.create_filter("", "")
+
+        # guess_type took the encoding for the language
+        self.assertEqual(admits("", "", "/static", "app.js.gz"), "javascript")
+        self.assertIsNone(path_filter.admit("/static", "app.js.gz"))
+
+
+class BulkUpdateTest(TestCase):
+
+    def setUp(self):
+        self.branch = Branch.objects.create(name="master", path="/")
+
+        Package.objects.bulk_create([Package(name="/%d" % i, branch=self.branch) for i in range(450)])
+
+        self.packages = list(Package.objects.filter(branch=self.branch).order_by("id"))
+
+    def test_chunk_size(self):
+        if connection.vendor == "sqlite":
+            self.assertEqual(sql.get_chunk_size(len(File.MEASURE_FIELDS)), sql.SQLITE_MAX_VARIABLES // (2 * len(File.MEASURE_FIELDS) + 1))
+            self.assertTrue(sql.get_chunk_size(len(File.MEASURE_FIELDS)) * len(File.MEASURE_FIELDS) < sql.SQLITE_MAX_VARIABLES)
+            self.assertEqual(sql.get_chunk_size(1000), 1)
+        else:
+            self.assertEqual(sql.get_chunk_size(len(File.MEASURE_FIELDS)), 500)
+
+    def test_updates_every_chunk(self):
+        rows = [(package.id, (i, i + 1)) for i, package in enumerate(self.packages)]
+
+        sql.bulk_update(Package, ["left", "right"], rows, chunk_size=100)
+
+        for i, package in enumerate(Package.objects.filter(branch=self.branch).order_by("id")):
+            self.assertEqual((package.left, package.right), (i, i + 1))
+
+
+class PreviousFilesTest(TestCase):
+
+    def setUp(self):
+        self.branch = Branch.objects.create(name="master", path="/")
+        self.package = Package.objects.create(name="/src", branch=self.branch)
+
+        date = datetime(2014, 1, 1, tzinfo=pytz.utc)
+
+        # git ingests the newest commit first, so ids do not follow the history
+        self.third = Revision.objects.create(identifier="c", branch=self.branch, date=date)
+        self.second = Revision.objects.create(identifier="b", branch=self.branch, date=date, next=self.third)
+        self.first = Revision.objects.create(identifier="a", branch=self.branch, date=date, next=self.second)
+
+        self.versions = [
+            self.add_file(self.first, Action.ADD),
+            self.add_file(self.second, Action.MODIFY),
+            self.add_file(self.third, Action.MODIFY)
+        ]
+
+    def add_file(self, revision, action):
+        return File.objects.create(
+            revision=revision,
+            date=revision.date,
+            name="main.js",
+            package=self.package.name,
+            pkg=self.package,
+            mimetype="javascript",
+            change_type=action
+        )
+
+    def test_unlinked_versions_follow_the_history(self):
+        first, second, third = self.versions
+
+        # storing results does not link the versions of the whole branch
+        self.assertEqual(self.second.get_previous_files([second]), {})
+        self.assertEqual(File.objects.filter(sequence=0).count(), 3)
+
+        self.branch.link_unlinked_files()
+
+        previous = self.second.get_previous_files([File.objects.get(pk=second.id)])
+        self.assertEqual(previous[second.id].id, first.id)
+
+        previous = self.third.get_previous_files([File.objects.get(pk=third.id)])
+        self.assertEqual(previous[third.id].id, second.id)
+
+    def test_skips_excluded_versions(self):
+        first, second, third = self.versions
+
+        self.branch.link_files()
+        File.objects.filter(pk=second.id).update(filtered="generated")
+
+        third = File.objects.get(pk=third.id)
+
+        self.assertEqual(self.third.get_previous_files([third])[third.id].id, first.id)
+
+
+class PlanMeasureTest(TestCase):
+
+    def setUp(self):
+        self.branch = Branch.objects.create(name="master", path="/")
+        self.other = Branch.objects.create(name="feature", path="/")
+
+        # the last revision is older than the one before it, so only the
+        # next pointers give the history order
+        dates = [datetime(2014, 1, day, tzinfo=pytz.utc) for day in [2, 6, 4, 3, 1]]
+        revisions = []
+
+        for index, date in enumerate(dates):
+            revisions.append(Revision.objects.create(identifier="%d" % index, branch=self.branch,
+                date=date, next=revisions[-1] if revisions else None))
+
+        self.r6, self.r5, self.r4, self.r3, self.r2 = revisions
+        self.r1 = Revision.objects.create(identifier="5", branch=self.branch, measured=True,
+            date=datetime(2013, 12, 1, tzinfo=pytz.utc), next=self.r2)
+
+        self.add_file(self.r1, "a.js", Action.ADD, "javascript")
+        self.add_file(self.r2, "a.js", Action.MODIFY, "javascript")
+        self.add_file(self.r3, "README", Action.ADD, "plain")
+        self.add_file(self.r4, "a.js", Action.DELETE, "javascript")
+        self.add_file(self.r5, "b.js", Action.ADD, "javascript")
+        self.add_file(self.r6, "B.java", Action.ADD, "x-java-source")
+
+        self.foreign = Revision.objects.create(identifier="0", branch=self.other,
+            date=datetime(2014, 1, 1, tzinfo=pytz.utc))
+
+    def add_file(self, revision, name, action, mimetype):
+        return File.objects.create(revision=revision, date=revision.date, name=name, package="/",
+            mimetype=mimetype, change_type=action)
+
+    def measured(self):
+        return dict(Revision.objects.values_list("id", "measured"))
+
+    def test_plan(self):
+        self.assertEqual(self.branch.plan_measure(), [self.r2.id, self.r5.id, self.r6.id])
+
+        measured = self.measured()
+
+        self.assertTrue(measured[self.r3.id])
+        self.assertTrue(measured[self.r4.id])
+        self.assertTrue(measured[self.r1.id])
+        self.assertFalse(measured[self.foreign.id])
+
+    def test_plan_from_revision(self):
+        self.assertEqual(self.branch.plan_measure(self.r5), [self.r5.id, self.r6.id])
+
+    def test_skip_revisions(self):
+        measurable = File.objects.filter(revision__branch=self.branch, mimetype="x-java-source").values("revision_id")
+
+        sql.skip_revisions(self.branch, measurable.query.sql_with_params())
+
+        measured = self.measured()
+
+        self.assertEqual([pk for pk in self.branch.revision_chain() if not measured[pk]], [self.r6.id])
+        self.assertFalse(measured[self.foreign.id])
+
+
+class RecomputeDeltasTest(TestCase):
+
+    def setUp(self):
+        self.branch = Branch.objects.create(name="master", path="/")
+        self.package = Package.objects.create(name="/src", branch=self.branch)
+        self.other = Package.objects.create(name="/lib", branch=self.branch)
+
+        # newest first like git ingests them, the last two share a timestamp
+        dates = [datetime(2014, 1, day, tzinfo=pytz.utc) for day in [5, 5, 3, 2, 1]]
+        revisions = []
+
+        for index, date in enumerate(dates):
+            revisions.append(Revision.objects.create(identifier="%d" % index, branch=self.branch,
+                date=date, measured=not index == 0, next=revisions[-1] if revisions else None))
+
+        r5, r4, r3, r2, r1 = revisions
+
+        self.add_file(r1, "a.js", Action.ADD, 10)
+        self.add_file(r2, "a.js", Action.MODIFY, 15)
+        self.add_file(r3, "a.js", Action.MODIFY, 40, faulty=True)
+        self.add_file(r4, "a.js", Action.MODIFY, 12)
+        self.add_file(r5, "a.js", Action.MODIFY, 20)
+
+        # the first version of b.js is filtered, so the second one becomes
+        # its initial version
+        self.add_file(r2, "b.js", Action.ADD, 5, filtered="generated")
+        self.add_file(r3, "b.js", Action.MODIFY, 8)
+        self.add_file(r4, "b.js", Action.MODIFY, 3)
+
+        self.add_file(r2, "a.js", Action.ADD, 7, pkg=self.other)
+        self.add_file(r4, "a.js", Action.MODIFY, 9, pkg=self.other)
+        self.add_file(r5, "a.js", Action.DELETE, 0, pkg=self.other)
+
+        self.branch.link_files()
+
+        self.expected = self.reference()
+
+    def add_file(self, revision, name, action, sloc, faulty=False, filtered=None, pkg=None):
+        pkg = pkg or self.package
+
+        return File.objects.create(revision=revision, date=revision.date, name=name, package=pkg.name,
+            pkg=pkg, mimetype="javascript", change_type=action, sloc=sloc, cyclomatic_complexity=sloc / 2,
+            faulty=faulty, filtered=filtered)
+
+    def state(self):
+        return dict((pk, (change_type, sloc_delta, cc_delta)) for pk, change_type, sloc_delta, cc_delta in
+            File.objects.values_list("id", "change_type", "sloc_delta", "cyclomatic_complexity_delta"))
+
+    def reference(self):
+        # the deltas of every measured file as the analyzer computes them
+        original = self.state()
+        files = File.objects.filter(revision__branch=self.branch, revision__measured=True,
+            change_type__in=Action.readable(), faulty=False, filtered__isnull=True)
+
+        self.branch.compute_deltas([f.id for f in files])
+
+        expected = self.state()
+
+        for pk, (change_type, sloc_delta, cc_delta) in original.iteritems():
+            File.objects.filter(pk=pk).update(change_type=change_type, sloc_delta=sloc_delta,
+                cyclomatic_complexity_delta=cc_delta)
+
+        return expected
+
+    def recompute(self, window_functions):
+        supported = sql.supports_window_functions
+        sql.supports_window_functions = lambda: window_functions
+
+        try:
+            self.branch.recompute_deltas()
+        finally:
+            sql.supports_window_functions = supported
+
+        return self.state()
+
+    def test_lagged_versions(self):
+        self.assertTrue(sql.supports_window_functions())
+        self.assertEqual(self.recompute(True), self.expected)
+
+    def test_sorted_versions(self):
+        self.assertEqual(self.recompute(False), self.expected)
+
+    def test_expected_deltas(self):
+        deltas = {}
+
+        for f in File.objects.all():
+            deltas[(f.pkg_id, f.name, f.revision.identifier)] = self.expected[f.id][:2]
+
+        self.assertEqual(deltas[(self.package.id, "a.js", "3")], (Action.MODIFY, 5))
+        self.assertEqual(deltas[(self.package.id, "a.js", "1")], (Action.MODIFY, -3))
+        self.assertEqual(deltas[(self.package.id, "b.js", "2")], (Action.ADD, 0))
+        self.assertEqual(deltas[(self.package.id, "b.js", "1")], (Action.MODIFY, -5))
+        self.assertEqual(deltas[(self.other.id, "a.js", "1")], (Action.MODIFY, 2))
+
+    def test_resets_measuring_flag(self):
+        def fail(*args):
+            raise RuntimeError("lost connection")
+
+        self.branch.measured = True
+        self.branch.save()
+
+        self.branch.rewrite_deltas = fail
+
+        self.assertRaises(RuntimeError, self.branch.recompute_deltas)
+
+        self.branch.abort_recompute_deltas("lost connection")
+
+        branch = Branch.objects.get(pk=self.branch.id)
+        self.assertFalse(branch.measuring)
+        self.assertTrue(branch.measured)
+
+
+class FakeJavaFile(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.faulty = False
+
+    def save(self):
+        pass
+
+
+class FakeJHawk(JHawk):
+
+    def __init__(self, broken=(), setup_broken=False, max_files=None, slow=()):
+        super(FakeJHawk, self).__init__(tempfile.gettempdir(), tempfile.gettempdir())
+
+        self.broken = broken
+        self.setup_broken = setup_broken
+        self.runs = 0
+
+        # chunks with more files or any slow file exceed the time limit
+        self.max_files = max_files
+        self.slow = slow
+
+    def write_configuration(self, chunk):
+        return chunk, None
+
+    def execute(self, cmd, timeout=None):
+        self.runs = self.runs + 1
+
+        chunk = cmd[-1]
+
+        if self.max_files and len(chunk) > self.max_files or [f for f in chunk if f.name in self.slow]:
+            raise CheckerTimeout(self, ["ant"], 600)
+
+        if self.setup_broken or [f for f in chunk if f.name in self.broken]:
+            raise CheckerException(self, ["ant"])
+
+
+class JHawkBisectTest(TestCase):
+
+    def setUp(self):
+        JHawk.working = False
+
+        self.files = [FakeJavaFile("F%d.java" % i) for i in range(8)]
+
+    def test_marks_broken_file(self):
+        checker = FakeJHawk(broken=["F5.java"])
+
+        self.assertEqual(checker.run_chunk(self.files), 1)
+        self.assertEqual([f.name for f in self.files if f.faulty], ["F5.java"])
+
+    def test_marks_broken_files_of_both_halves(self):
+        checker = FakeJHawk(broken=["F1.java", "F6.java"])
+
+        self.assertEqual(checker.run_chunk(self.files), 2)
+        self.assertEqual([f.name for f in self.files if f.faulty], ["F1.java", "F6.java"])
+
+    def test_raises_broken_setup(self):
+        checker = FakeJHawk(setup_broken=True)
+
+        self.assertRaises(CheckerException, checker.run_chunk, self.files)
+        self.assertEqual([f for f in self.files if f.faulty], [])
+        # gives up once the first pair of single files failed
+        self.assertEqual(checker.runs, 5)
+
+    def test_splits_chunk_that_timed_out(self):
+        checker = FakeJHawk(max_files=3)
+
+        self.assertEqual(checker.run_chunk(self.files), 0)
+        self.assertEqual([f for f in self.files if f.faulty], [])
+        # the results of all four quarters are kept
+        self.assertEqual(len(checker.results), 4)
+
+    def test_marks_slow_file(self):
+        checker = FakeJHawk(max_files=3, slow=["F2.java"])
+
+        self.assertEqual(checker.run_chunk(self.files), 1)
+        self.assertEqual([f.name for f in self.files if f.faulty], ["F2.java"])
+        self.assertEqual([f.name for f in checker.timeouts], ["F2.java"])
+        self.assertEqual(len(checker.results), 4)
+
+    def test_single_file(self):
+        checker = FakeJHawk(broken=["F0.java"])
+
+        self.assertRaises(CheckerException, checker.run_chunk, self.files[:1])
+
+        checker.run_chunk(self.files[1:2])
+
+        self.assertEqual(checker.run_chunk(self.files[:1]), 1)
+        self.assertTrue(self.files[0].faulty)
+
+
+JHAWK_REPORT = """<?xml version="1.0" encoding="UTF-8"?>
+<Project xmlns="http://www.virtualmachinery.com/jhawk">
+  <Packages>
+    <Package>
+      <Name>com.acme</Name>
+      <Classes>
+        <Class>
+          <ClassName>Invoice</ClassName>
+          <Metrics><loc>40</loc><fanIn>2</fanIn><fanOut>3</fanOut></Metrics>
+          <Methods>
+            <Method>
+              <Name>total</Name>
+              <Metrics><loc>10</loc><halsteadVolume>100</halsteadVolume><halsteadEffort>500</halsteadEffort><cyclomaticComplexity>3</cyclomaticComplexity></Metrics>
+            </Method>
+          </Methods>
+          <Class>
+            <ClassName>Invoice$Line</ClassName>
+            <Metrics><loc>12</loc><fanIn>1</fanIn><fanOut>1</fanOut></Metrics>
+            <Methods>
+              <Method>
+                <Name>sum</Name>
+                <Metrics><loc>20</loc><halsteadVolume>300</halsteadVolume><halsteadEffort>900</halsteadEffort><cyclomaticComplexity>7</cyclomaticComplexity></Metrics>
+              </Method>
+            </Methods>
+          </Class>
+        </Class>
+        <Class>
+          <ClassName>Empty</ClassName>
+          <Metrics><loc>1</loc><fanIn>0</fanIn><fanOut>0</fanOut></Metrics>
+        </Class>
+      </Classes>
+    </Package>
+    <Package>
+      <Name>com.other</Name>
+      <Classes>
+        <Class>
+          <ClassName>Unknown</ClassName>
+          <Metrics><loc>5</loc><fanIn>0</fanIn><fanOut>0</fanOut></Metrics>
+        </Class>
+      </Classes>
+    </Package>
+  </Packages>
+</Project>
+"""
+
+
+class JHawkReportTest(TestCase):
+
+    def setUp(self):
+        self.checker = JHawk(tempfile.gettempdir(), tempfile.gettempdir())
+        self.checker.files = ["/src/com/acme/Invoice.java", "/src/com/acme/Empty.java"]
+
+        self.report = tempfile.TemporaryFile()
+        self.report.write(JHAWK_REPORT)
+        self.report.seek(0)
+
+    def tearDown(self):
+        self.report.close()
+
+    def test_streams_report(self):
+        processed = []
+
+        self.checker.parse_report(XMLSanitizer(self.report), processed)
+
+        self.assertEqual(processed, ["com/acme/Invoice.java", "com/acme/Empty.java"])
+        self.assertEqual(self.checker.measures.keys(), ["com/acme/Invoice.java"])
+
+        measures = self.checker.measures["com/acme/Invoice.java"]
+
+        # the methods of nested classes count for their outer class
+        methods = [{"cyclomaticComplexity": 3.0}, {"cyclomaticComplexity": 7.0}]
+
+        self.assertEqual(measures["cyclomatic_complexity"], self.checker.get_decimal(self.checker.get_cc_squale(methods)))
+        self.assertEqual(measures["sloc_absolute"], Decimal("40"))
+        self.assertEqual(measures["fan_in"], self.checker.get_decimal(self.checker.get_fan_in_mark(2)))
+        self.assertEqual(measures["fan_out"], self.checker.get_decimal(self.checker.get_fan_out_mark(3)))
+
+    def test_sanitizer(self):
+        report = XMLSanitizer(self.report)
+        content = "".join(iter(lambda: report.read(7), ""))
+
+        self.assertFalse("\x01" in content)
+        self.assertTrue("<ClassName>Unknown?</ClassName>" in content)
+
+
+class SuffixIndexTest(TestCase):
+
+    def setUp(self):
+        self.paths = [
+            "/src/com/acme/Invoice.java",
+            "/src/com/acme/billing/Invoice.java",
+            "/src/com/acme/MyInvoice.java",
+            "/test/com/acme/Invoice.java"
+        ]
+        self.index = SuffixIndex(self.paths)
+
+    def ends_with(self, path):
+        # what includes and mark_faults used to check, path by path
+        return [p for p in self.paths if p.endswith("/" + path)]
+
+    def test_find(self):
+        for path in ["com/acme/Invoice.java", "Invoice.java", "acme/MyInvoice.java", "billing/Invoice.java",
+                     "src/com/acme/Invoice.java", "org/acme/Invoice.java", "Other.java"]:
+            self.assertEqual(sorted(self.index.find(path)), sorted(self.ends_with(path)))
+
+    def test_whole_components(self):
+        self.assertEqual(self.index.find("nvoice.java"), [])
+        self.assertEqual(self.index.find("Invoice.java"), [
+            "/src/com/acme/Invoice.java", "/src/com/acme/billing/Invoice.java", "/test/com/acme/Invoice.java"
+        ])
+
+    def test_includes(self):
+        checker = JHawk(tempfile.gettempdir(), tempfile.gettempdir())
+        checker.files = list(self.paths)
+
+        self.assertTrue(checker.includes("billing/Invoice.java"))
+        self.assertFalse(checker.includes("com/acme/Other.java"))
+
+
+class FakePool(object):
+
+    def __init__(self, workers):
+        self.tasks = []
+
+    def imap(self, func, tasks):
+        for branch, worker, revisions in tasks:
+            self.tasks.append(revisions)
+
+            if worker == 2:
+                raise RuntimeError("worker crashed")
+
+            yield []
+
+    def close(self):
+        pass
+
+    def join(self):
+        pass
+
+
+class FakeConnector(object):
+
+    def switch_to(self, branch):
+        pass
+
+    def close(self):
+        pass
+
+
+class ParallelMeasureTest(TestCase):
+
+    def setUp(self):
+        self.branch = Branch.objects.create(name="master", path="/")
+        self.package = Package.objects.create(name="/src", branch=self.branch)
+
+        revisions = []
+
+        for i in range(8):
+            date = datetime(2014, 1, i + 1, tzinfo=pytz.utc)
+            revision = Revision.objects.create(identifier="%d" % i, branch=self.branch, date=date)
+
+            File.objects.create(revision=revision, date=date, name="main.js", package="/src",
+                pkg=self.package, mimetype="javascript", change_type=Action.MODIFY)
+
+            if revisions:
+                Revision.objects.filter(pk=revisions[-1].id).update(next=revision)
+
+            revisions.append(revision)
+
+        self.revisions = [revision.id for revision in revisions]
+
+        self.pool = analyzers.Pool
+        analyzers.Pool = FakePool
+
+    def tearDown(self):
+        analyzers.Pool = self.pool
+
+    def test_flags_contiguous_ranges_in_order(self):
+        analyzer = analyzers.Analyzer.__new__(analyzers.Analyzer)
+        analyzer.branch = self.branch
+        analyzer.connector = FakeConnector()
+
+        self.assertRaises(RuntimeError, analyzer.start_parallel, workers=4)
+
+        measured = list(self.branch.revisions.filter(measured=True).order_by("date").values_list("id", flat=True))
+
+        # the ranges of the first two workers are done, everything after the
+        # crashed one is left for resuming
+        self.assertEqual(measured, self.revisions[:4])
+
+
+class LimitedCheckerTest(TestCase):
+
+    def setUp(self):
+        self.checker = Checker.__new__(Checker)
+
+    def test_runs_command(self):
+        stdout = self.checker.execute(["sh", "-c", "echo $0 \"$1\"", "first", "second arg"])
+
+        self.assertEqual(stdout, "first second arg\n")
+
+    def test_kills_process_group(self):
+        self.assertRaises(CheckerTimeout, self.checker.execute, ["sh", "-c", "sleep 30; echo done"], timeout=1)
+
+    def test_cpu_limit(self):
+        cpu_limit = checkers.CHECKER_CPU_LIMIT
+        checkers.CHECKER_CPU_LIMIT = 1
+
+        try:
+            self.assertRaises(CheckerTimeout, self.checker.execute, ["sh", "-c", "while :; do :; done"], timeout=30)
+        finally:
+            checkers.CHECKER_CPU_LIMIT = cpu_limit
+
+
+# answers every request and crashes on files named crash.js
+FAKE_WORKER = """
+var readline = require("readline");
+var lines = readline.createInterface({ input: process.stdin, terminal: false });
+
+lines.on("line", function (line) {
+    var request = JSON.parse(line);
+
+    if (/crash\\.js$/.test(request.path)) {
+        process.exit(1);
+    }
+
+    process.stdout.write(JSON.stringify({ id: request.id, report: { path: request.path } }) + "\\n");
+});
+"""
+
+BROKEN_WORKER = """
+console.error("Cannot find module 'escomplex-js'");
+process.exit(1);
+"""
+
+
+class FakeScriptFile(object):
+
+    def __init__(self, path):
+        self.path = path
+        self.faulty = False
+
+    def full_path(self):
+        return self.path
+
+    def get_identifier(self):
+        return self.path
+
+    def save(self):
+        pass
+
+
+class ComplexityReportWorkerTest(TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def create_checker(self, script):
+        filename = "%s/worker.js" % self.path
+
+        with open(filename, "w") as f:
+            f.write(script)
+
+        checker = ComplexityReport.__new__(ComplexityReport)
+        checker.worker = NodeWorker(filename)
+        checker.base_path = self.path
+        checker.timeouts = []
+        checker.failed = []
+        checker.reports = {}
+
+        return checker
+
+    def test_broken_worker(self):
+        checker = self.create_checker(BROKEN_WORKER)
+        checker.files = [FakeScriptFile("/main.js")]
+
+        try:
+            checker.run_worker()
+        except CheckerException, e:
+            self.assertTrue("escomplex-js" in e.stderr)
+        else:
+            self.fail("the broken worker was not reported")
+
+        self.assertFalse(checker.files[0].faulty)
+
+    def test_marks_crashing_file(self):
+        checker = self.create_checker(FAKE_WORKER)
+        checker.files = [FakeScriptFile("/main.js"), FakeScriptFile("/crash.js"), FakeScriptFile("/lib.js")]
+
+        try:
+            checker.run_worker()
+        finally:
+            checker.worker.stop()
+
+        self.assertEqual([f.faulty for f in checker.files], [False, True, False])
+        self.assertEqual(sorted(checker.reports.keys()), ["/lib.js", "/main.js"])
+
+
+class RecordingAnalyzer(analyzers.Analyzer):
+
+    def __init__(self):
+        self.connector = FakeConnector()
+        self.branch = None
+        self.measured = []
+
+    def planned(self, revisions):
+        return []
+
+    def pipeline(self, revisions):
+        self.measured.append("pipeline")
+
+
+class PipelineTest(TestCase):
+
+    def test_not_used_with_sqlite(self):
+        analyzer = RecordingAnalyzer()
+        analyzer.branch = Branch(name="master", path="/")
+        analyzer.branch.plan_measure = lambda revision: []
+
+        analyzer.start()
+
+        self.assertEqual(analyzer.measured, [])
+
+    def create_analyzer(self, **kwargs):
+        analyzer = PipelineAnalyzer(**kwargs)
+        analyzer.connector = FakePipelineConnector()
+
+        return analyzer
+
+    def test_flags_in_chain_order(self):
+        analyzer = self.create_analyzer()
+        revisions = [FakePipelineRevision(analyzer, i) for i in range(12)]
+
+        analyzer.pipeline(iter(revisions))
+
+        self.assertEqual(analyzer.events, [
+            event for revision in revisions for event in [("store", revision.number), ("flag", revision.number)]
+        ])
+
+    def test_failing_collector_stops_the_other_stages(self):
+        analyzer = self.create_analyzer(fail_collect=3)
+        prepared = []
+
+        def revisions():
+            for i in range(100):
+                prepared.append(i)
+
+                yield FakePipelineRevision(analyzer, i)
+
+        self.assertRaises(RuntimeError, analyzer.pipeline, revisions())
+
+        flagged = [number for event, number in analyzer.events if event == "flag"]
+
+        # nothing after the failed revision is flagged and preparing stops
+        # within the depth of the queues
+        self.assertEqual(flagged, range(len(flagged)))
+        self.assertTrue(len(flagged) <= 3)
+        self.assertTrue(len(prepared) < 10)
+        self.assertEqual(analyzer.threads(), [])
+
+    def test_failing_store_stops_the_other_stages(self):
+        analyzer = self.create_analyzer(fail_store=2)
+        prepared = []
+
+        def revisions():
+            for i in range(100):
+                prepared.append(i)
+
+                yield FakePipelineRevision(analyzer, i)
+
+        self.assertRaises(RuntimeError, analyzer.pipeline, revisions())
+
+        self.assertEqual([number for event, number in analyzer.events if event == "flag"], [0, 1])
+        self.assertTrue(len(prepared) < 10)
+        self.assertEqual(analyzer.threads(), [])
+
+
+class FakePipelineConnector(FakeConnector):
+
+    def prefetches(self):
+        return False
+
+    def prepare(self, revision, files, slot=None):
+        time.sleep(random.random() / 200)
+
+
+class FakePipelineRevision(object):
+
+    def __init__(self, analyzer, number):
+        self.analyzer = analyzer
+        self.number = number
+        self.measured = False
+
+    def modified_files(self):
+        return []
+
+    def save(self):
+        self.analyzer.events.append(("flag", self.number))
+
+
+class PipelineAnalyzer(analyzers.Analyzer):
+
+    def __init__(self, fail_collect=None, fail_store=None):
+        self.fail_collect = fail_collect
+        self.fail_store = fail_store
+        self.events = []
+
+        self.started = set(threading.enumerate())
+
+    def threads(self):
+        return [thread for thread in threading.enumerate() if not thread in self.started]
+
+    def collect(self, revision, files=None):
+        time.sleep(random.random() / 200)
+
+        if revision.number == self.fail_collect:
+            raise RuntimeError("checker crashed")
+
+        return {}, []
+
+    def store(self, revision, results, entries=()):
+        time.sleep(random.random() / 100)
+
+        if revision.number == self.fail_store:
+            raise RuntimeError("database gone")
+
+        self.events.append(("store", revision.number))
+
+
+class FakeCache(object):
+
+    def __init__(self):
+        self.added = []
+
+    def lookup(self, checker, hashes):
+        return {}
+
+    def add(self, checker, measures):
+        self.added.append((checker, measures))
+
+
+class FakeBaseAnalyzer(analyzers.BaseAnalyzer):
+
+    def measure(self, revision, connector):
+        # the second result only carries a suffix of its path
+        return {
+            "/src/a/Foo.js": {"sloc": 1},
+            "b/Foo.js": {"sloc": 2}
+        }
+
+
+class FakeHashConnector(object):
+
+    def get_content_hash(self, f):
+        return "hash of %s" % f.full_path()
+
+
+class MeasureCacheTest(TestCase):
+
+    def setUp(self):
+        self.analyzer = analyzers.Analyzer.__new__(analyzers.Analyzer)
+        self.analyzer.connector = FakeHashConnector()
+        self.analyzer.cache = FakeCache()
+        self.analyzer.quarantine = None
+        self.analyzer.source_filter = None
+
+        self.files = [
+            File(package="/src/a", name="Foo.js", mimetype="javascript"),
+            File(package="/src/b", name="Foo.js", mimetype="javascript")
+        ]
+
+    def test_caches_exact_paths_only(self):
+        self.analyzer.analyzers = {"javascript": [FakeBaseAnalyzer(analyzers.ComplexityReport)]}
+
+        results, entries = self.analyzer.collect(None, self.files)
+
+        self.assertEqual(entries, [(analyzers.ComplexityReport, {"hash of /src/a/Foo.js": {"sloc": 1}})])
+
+    def test_does_not_cache_jhawk(self):
+        self.analyzer.analyzers = {"javascript": [FakeBaseAnalyzer(JHawk)]}
+
+        results, entries = self.analyzer.collect(None, self.files)
+
+        self.assertEqual(len(results), 2)
+        self.assertEqual(entries, [])
+
+
+class FakeVersionReport(ComplexityReport):
+
+    tool_versions = {}
+
+    @classmethod
+    def read_tool_version(cls, cmd):
+        return "1.0.0"
+
+
+class CheckerVersionTest(TestCase):
+
+    def setUp(self):
+        self.worker = checkers.COMPLEXITY_REPORT_WORKER
+
+    def tearDown(self):
+        checkers.COMPLEXITY_REPORT_WORKER = self.worker
+
+    def test_lizard(self):
+        self.assertTrue(Lizard.get_version().endswith("lizard %s" % lizard.version))
+
+    def test_complexity_report_modes(self):
+        checkers.COMPLEXITY_REPORT_WORKER = True
+        worker = FakeVersionReport.get_version()
+
+        checkers.COMPLEXITY_REPORT_WORKER = False
+        cli = FakeVersionReport.get_version()
+
+        self.assertTrue(worker.endswith("escomplex-js 1.0.0"))
+        self.assertTrue(cli.endswith("cr 1.0.0"))
+
+    def test_unknown_version(self):
+        self.assertRaises(CheckerException, ComplexityReport.read_tool_version, ["sh", "-c", "exit 1"])
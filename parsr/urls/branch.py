@@ -19,9 +19,12 @@ urlpatterns = patterns('parsr.views.branch',
 
     url(r"^/analyze$", "analyze"),
     url(r"^/analyze/resume$", "resume_analyze"),
+    url(r"^/analyze/update$", "update_analyze"),
 
     url(r"^/measure$", "measure"),
     url(r"^/measure/resume$", "resume_measure"),
+    url(r"^/measure/update$", "update_measure"),
+    url(r"^/measure/deltas$", "recompute_deltas"),
 
     url(r"^/author/(?P<author_id>\d+)", include("parsr.urls.author")),
 )
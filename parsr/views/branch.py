@@ -65,6 +65,15 @@ def resume_analyze(request, branch_id):
     return track_action(branch, lambda: branch.analyze(resume=True), lambda x: branch.abort_analyze(x))
 
 
+@login_required
+@ajax_request
+@require_POST
+def update_analyze(request, branch_id):
+    branch = get_branch(branch_id)
+
+    return track_action(branch, lambda: branch.analyze(incremental=True), lambda x: branch.abort_analyze(x))
+
+
 @login_required
 @ajax_request
 @require_POST
@@ -83,6 +92,24 @@ def resume_measure(request, branch_id):
     return track_action(branch, lambda: branch.measure(resume=True), lambda x: branch.abort_measure(x))
 
 
+@login_required
+@ajax_request
+@require_POST
+def update_measure(request, branch_id):
+    branch = get_branch(branch_id)
+
+    return track_action(branch, lambda: branch.measure(incremental=True), lambda x: branch.abort_measure(x))
+
+
+@login_required
+@ajax_request
+@require_POST
+def recompute_deltas(request, branch_id):
+    branch = get_branch(branch_id)
+
+    return track_action(branch, lambda: branch.recompute_deltas(), lambda x: branch.abort_recompute_deltas(x))
+
+
 @login_required
 @ajax_request
 def info(request, branch_id):
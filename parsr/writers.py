@@ -0,0 +1,105 @@
+from django.db import transaction
+from django.db.models import Max
+
+from parsr import sql
+
+from analyzr.settings import INGESTION_BATCH_SIZE
+
+
+class BatchWriter(object):
+    """
+    Buffers the revisions and files created while a branch is analyzed and
+    writes them with bulk inserts, one transaction per batch.
+    """
+
+    def __init__(self, branch, authors, packages, size=INGESTION_BATCH_SIZE):
+        self.branch = branch
+        self.authors = authors
+        self.packages = packages
+        self.size = size
+
+        self.revisions = []
+        self.files = []
+        self.links = []
+
+    def add_file(self, f):
+        self.files.append(f)
+
+    def add(self, revision, next=None):
+        self.revisions.append(revision)
+
+        if next:
+            self.link(revision, next)
+
+        if len(self.revisions) >= self.size:
+            self.flush()
+
+    def link(self, revision, next):
+        self.links.append((revision, next))
+
+    def write_revisions(self):
+        if not self.revisions:
+            return
+
+        cls = self.revisions[0].__class__
+
+        last_id = cls.objects.aggregate(last=Max("id"))["last"] or 0
+
+        for revision in self.revisions:
+            revision.author_id = revision.author.id if revision.author else None
+
+        cls.objects.bulk_create(self.revisions)
+
+        # bulk_create does not hand back primary keys so they are read
+        # back in one query in order to connect the files
+        created = cls.objects\
+                     .filter(branch=self.branch, id__gt=last_id)\
+                     .values_list("identifier", "id")
+
+        ids = dict(created)
+
+        for revision in self.revisions:
+            revision.id = ids[revision.identifier]
+
+        self.revisions = []
+
+    def write_files(self):
+        if not self.files:
+            return
+
+        cls = self.files[0].__class__
+
+        for f in self.files:
+            f.revision_id = f.revision.id
+            f.author_id = f.author.id if f.author else None
+            f.pkg_id = f.pkg.id
+
+        cls.objects.bulk_create(self.files)
+
+        self.files = []
+
+    def write_links(self):
+        links = []
+        pending = []
+
+        for revision, next in self.links:
+            if revision.id and next.id:
+                links.append((revision.id, next.id))
+            else:
+                pending.append((revision, next))
+
+        sql.link_revisions(links)
+
+        self.links = pending
+
+    def flush(self):
+        with transaction.atomic():
+            self.authors.flush()
+            self.packages.flush()
+
+            self.write_revisions()
+            self.write_files()
+            self.write_links()
+
+    def finish(self):
+        self.flush()